@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+# Building the test programs with wabbit.c.cc(): with the compiler run
+# every time, as before the build cache, against builds that hit it
+#
+#   scripts/bench_build.py [-n N] [file.wb ...]
+#
+# -n N     report the best of N runs (default 3)
+
+import glob
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit import build
+from wabbit.c import compile_c
+from timing import best
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def main(args):
+    repeat = 3
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['WABBIT_CACHE_DIR'] = tmp
+        files = []
+        for i, filename in enumerate(args or DEFAULT_FILES):
+            with open(filename) as f:
+                c = os.path.join(tmp, f'{i}.c')
+                with open(c, 'w') as out:
+                    compile_c(f.read(), out)
+            files.append(c)
+
+        def run(cache):
+            for c in files:
+                build.build(c, c[:-2], cache=cache)
+
+        run(True)
+        uncached = best(lambda: run(False), repeat)
+        cached = best(lambda: run(True), repeat)
+        print(f'{len(files)} programs')
+        print(f'compiler   {uncached * 1000:8.1f}ms')
+        print(f'cached     {cached * 1000:8.1f}ms {uncached / cached:6.1f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Time the C backend on generated programs of growing size, to check it
+# scales linearly: compile_c() to a string, and streamed to a file
+#
+#   scripts/bench_c.py [--sizes 1000,10000,...] [--max N] [--loops]
+#
+# --sizes      numbers of statements (default 1k to 1M, x10)
+# --max N      stop before sizes over N
+# --loops      a script of top level while loops instead of functions
+
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.c import compile_c
+from wabbit.fastparse import parse
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+def program(n):
+    '''about n statements: functions of 100, some nested in ifs and whiles'''
+    lines = []
+    count = 0
+    f = 0
+    while count < n:
+        lines.append(f'func f{f}(x int) int {{')
+        lines.append('    var a int = x;')
+        for i in range(10):
+            lines.append(f'    if a < {i} {{')
+            for j in range(4):
+                lines.append(f'        a = a + {j} * x;')
+            lines.append('    } else {')
+            lines.append(f'        while a > {i} {{ a = a - 1; }}')
+            lines.append('        print a;')
+            lines.append('    }')
+        lines.append('    return a;')
+        lines.append('}')
+        lines.append(f'print f{f}({f});')
+        count += 100
+        f += 1
+    return '\n'.join(lines) + '\n'
+
+def loops(n):
+    '''about n statements: while loops of 5, nested two deep in the script'''
+    lines = ['var a int = 0;', 'var b int = 0;']
+    for k in range(0, n, 5):
+        lines.append(f'while a < {k} * 2 + b {{')
+        lines.append(f'    b = b + a * {k};')
+        lines.append(f'    while b > a + {k} {{ b = b - (a + 1) * 2; }}')
+        lines.append('    a = a + 1;')
+        lines.append('}')
+        lines.append('print a + b;')
+    return '\n'.join(lines) + '\n'
+
+def main(args):
+    sizes = SIZES
+    if '--sizes' in args:
+        i = args.index('--sizes')
+        sizes = [int(_) for _ in args[i+1].split(',')]
+        args = args[:i] + args[i+2:]
+
+    if '--max' in args:
+        i = args.index('--max')
+        sizes = [_ for _ in sizes if _ <= int(args[i+1])]
+        args = args[:i] + args[i+2:]
+
+    generate = program
+    if '--loops' in args:
+        generate = loops
+        args.remove('--loops')
+
+    print(f'{"statements":>10s} {"string":>10s} {"stream":>10s} {"us/stmt":>8s}')
+    for n in sizes:
+        text = generate(n)
+
+        # each run needs a fresh model, the backend annotates it
+        model = parse(text)
+        start = time.perf_counter()
+        compile_c(model)
+        t = time.perf_counter() - start
+
+        model = parse(text)
+        with tempfile.TemporaryFile('w') as f:
+            start = time.perf_counter()
+            compile_c(model, f)
+            t2 = time.perf_counter() - start
+
+        print(f'{n:10d} {t:9.3f}s {t2:9.3f}s {t / n * 1e6:8.2f}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
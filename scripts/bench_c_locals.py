@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Size of the C the backend generates: variables declared in functions,
+# globals, lines, and how long clang takes to compile it
+#
+#   scripts/bench_c_locals.py [-n N] [-O LEVEL] [file.wb ...]
+#
+# -n N         report the best of N compiles (default 3)
+# -O LEVEL     clang optimization level (default 0)
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.c import compile_c
+from timing import best
+
+DEFAULT_FILES = [os.path.join(ROOT, 'tests/Func/mandel.wb')]
+
+DECL = re.compile(r'(int|double|bool|char|int\*) \w+;$')
+
+def count(code):
+    '''(locals, globals) declared in code'''
+    local = glob = 0
+    depth = 0
+    for line in code.splitlines():
+        if line.endswith('{'):
+            depth += 1
+        elif line == '}':
+            depth -= 1
+        elif DECL.match(line):
+            if depth:
+                local += 1
+            else:
+                glob += 1
+    return local, glob
+
+def main(args):
+    repeat = 3
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    level = '0'
+    if '-O' in args:
+        i = args.index('-O')
+        level = args[i+1]
+        args = args[:i] + args[i+2:]
+
+    print(f'{"file":20s} {"locals":>7s} {"globals":>7s} {"lines":>6s} {"clang -O" + level:>10s}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for filename in args or DEFAULT_FILES:
+            with open(filename) as f:
+                code = compile_c(f.read())
+            local, glob = count(code)
+
+            c = os.path.join(tmp, 'out.c')
+            with open(c, 'w') as f:
+                f.write(code)
+            cmd = ['clang', f'-O{level}', '-w', c, '-o', os.path.join(tmp, 'out')]
+            t = best(lambda: subprocess.run(cmd, check=True), repeat)
+
+            name = os.path.basename(filename)
+            print(f'{name:20s} {local:7d} {glob:7d} {code.count(chr(10)):6d} {t * 1000:8.1f}ms')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
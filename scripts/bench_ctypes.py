@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Calling a small wabbit function from python: running the built
+# executable for every call, against calling it in the shared library
+# wabbit.c.load() builds, and the cost of load() itself
+#
+#   scripts/bench_ctypes.py [-n N] [--calls C]
+#
+# -n N         report the best of N runs (default 3)
+# --calls C    number of calls through the library (default 1000000)
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.c import cc, load
+from timing import best
+
+SOURCE = '''
+func clamp(x int, lo int, hi int) int {
+    if x < lo {
+        return lo;
+    }
+    if x > hi {
+        return hi;
+    }
+    return x;
+}
+'''
+
+def main(args):
+    repeat = 3
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    calls = 1000000
+    if '--calls' in args:
+        i = args.index('--calls')
+        calls = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['WABBIT_CACHE_DIR'] = tmp
+        c = os.path.join(tmp, 'prog.c')
+        source = SOURCE + 'func main() int { return clamp(5, 0, 3); }\n'
+        cc(source, c, 'release')
+        spawn = best(lambda: subprocess.run([c[:-2]], check=True), repeat)
+
+        start = time.perf_counter()
+        lib = load(source)
+        cold = time.perf_counter() - start
+        warm = best(lambda: load(source), repeat)
+
+        clamp = lib.funcs.clamp
+        def run():
+            for i in range(calls):
+                clamp(i, 100, 200)
+        t = best(run, repeat)
+
+    print(f'spawn executable    {spawn * 1e6:10.1f}us/call')
+    print(f'library call        {t / calls * 1e6:10.3f}us/call {spawn / (t / calls):8.0f}x')
+    print(f'load, first         {cold * 1000:10.1f}ms')
+    print(f'load, same program  {warm * 1e6:10.1f}us')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
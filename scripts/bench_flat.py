@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Compare the model with its flat encoding (wabbit/flat.py) on a big
+# program, made of the test programs repeated: memory, conversion,
+# pickling, and a whole-program pass that counts the names used
+#
+#   scripts/bench_flat.py [-n N] [--copies C] [file.wb ...]
+#
+# -n N         report the best of N runs
+# --copies C   repeat the input C times (default 50)
+
+import collections
+import glob
+import os
+import pickle
+import sys
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.closure import walk
+from wabbit.flat import KIND, FlatTree
+from wabbit.model import Name
+from wabbit.parse import parse
+from timing import best
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def allocated(f):
+    '''the result of f(), and the bytes it still holds'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = f()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return result, sum(_.size_diff for _ in after.compare_to(before, 'filename'))
+
+def count_names(program):
+    return collections.Counter(_.value for _ in walk(program) if isinstance(_, Name))
+
+def count_flat_names(tree):
+    # the value of a Name is its only operand
+    NAME = KIND[Name]
+    operands, offsets, values = tree.operands, tree.offsets, tree.values
+    return collections.Counter(values[operands[offsets[i]] >> 2]
+                               for i, kind in enumerate(tree.kinds) if kind == NAME)
+
+def main(args):
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    copies = 50
+    if '--copies' in args:
+        i = args.index('--copies')
+        copies = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    text = ''
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            text += f.read() + '\n'
+    text *= copies
+
+    program, model_size = allocated(lambda: parse(text, 'fast'))
+    tree, flat_size = allocated(lambda: FlatTree.from_model(program))
+    print(f'{len(tree)} nodes')
+    print(f'{"":16s} {"model":>10s} {"flat":>10s}')
+    print(f'{"memory":16s} {model_size / 1e6:8.1f}MB {flat_size / 1e6:8.1f}MB')
+
+    model_pickle = pickle.dumps(program)
+    flat_pickle = pickle.dumps(tree)
+    print(f'{"pickle size":16s} {len(model_pickle) / 1e6:8.1f}MB {len(flat_pickle) / 1e6:8.1f}MB')
+
+    rows = [
+        ('pickle', lambda: pickle.dumps(program), lambda: pickle.dumps(tree)),
+        ('unpickle', lambda: pickle.loads(model_pickle), lambda: pickle.loads(flat_pickle)),
+        ('count names', lambda: count_names(program), lambda: count_flat_names(tree)),
+    ]
+    for name, m, f in rows:
+        print(f'{name:16s} {best(m, repeat) * 1000:8.1f}ms {best(f, repeat) * 1000:8.1f}ms')
+
+    assert count_names(program) == count_flat_names(tree)
+    print(f'{"from_model":16s} {best(lambda: FlatTree.from_model(program), repeat) * 1000:8.1f}ms')
+    print(f'{"to_model":16s} {best(lambda: tree.to_model(), repeat) * 1000:8.1f}ms')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
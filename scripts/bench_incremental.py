@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Time typical editor edits with wabbit.incremental against parsing the
+# whole text, on a generated program of about 10k lines
+#
+#   scripts/bench_incremental.py [-n N] [--lines L] [--check]
+#
+# -n N         report the best of N runs (default 20)
+# --lines L    size of the program (default 10000)
+# --check      check the model against a full parse after every edit
+
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.fastparse import parse
+from wabbit.incremental import Document
+from timing import best
+
+FUNC = '''\
+func f{i}(n int, x float) int {{
+    var total int = 0;
+    while n > 0 {{
+        if n < {i} {{
+            total = total + n * {i};
+        }} else {{
+            total = total - 1;
+        }}
+        n = n - 1;
+    }}
+    return total;
+}}
+'''
+
+def program(lines):
+    items = []
+    for i in range(lines // (FUNC.count('\n') + 1)):
+        items.append(FUNC.format(i=i))
+        items.append(f'print f{i}({i}, 1.5);\n')
+    return ''.join(items)
+
+def edits(text):
+    '''(name, [(offset, deleted, inserted), ...]) done in order, then undone'''
+    middle = text.index('func', len(text) // 2)
+    body = text.index('total + n', middle) + len('total + n')
+    line = text.index('\n', middle) + 1
+    length = text.index('\n', line) + 1 - line
+    return [
+        ('type a character', [(body, 0, '1')]),
+        ('insert a statement', [(line, 0, '    print 42;\n')]),
+        ('delete a line', [(line, length, '')]),
+        ('comment out a line', [(line, length - 1, '/* ' + text[line:line + length - 1] + ' */')]),
+        ('unclosed comment', [(line, 0, '/* ')]),
+        ('rename a function', [(middle + 5, 0, 'x')]),
+    ]
+
+def main(args):
+    repeat = 20
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    lines = 10000
+    if '--lines' in args:
+        i = args.index('--lines')
+        lines = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    check = '--check' in args
+
+    text = program(lines)
+    print(f'{text.count(chr(10))} lines, {len(text)} characters')
+
+    t = best(lambda: parse(text), max(1, repeat // 5))
+    print(f'{"full parse":24s} {t * 1000:8.2f}ms')
+
+    doc = Document(text)
+    for name, steps in edits(text):
+        elapsed = None
+        for _ in range(repeat):
+            undo = []
+            for offset, deleted, inserted in steps:
+                undo.append((offset, len(inserted), doc.text[offset:offset + deleted]))
+                start = time.perf_counter()
+                try:
+                    doc.edit(offset, deleted, inserted)
+                    result = '{} statements, {} tokens reparsed'
+                except SyntaxError:
+                    result = 'syntax error'
+                t = time.perf_counter() - start
+                elapsed = t if elapsed is None else min(elapsed, t)
+                if check and doc.valid:
+                    assert doc.model == parse(doc.text), name
+            result = result.format(*doc.region[2:])
+            for offset, deleted, inserted in reversed(undo):
+                doc.edit(offset, deleted, inserted)
+            assert doc.text == text
+        print(f'{name:24s} {elapsed * 1000:8.2f}ms   {result}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Time the interpreter engines against each other
+#
+#   scripts/bench_interp.py [--engines tree,closure,vm] [-n N] [--calls] [file.wb ...]
+#
+# -n N     report the best of N runs
+# --calls  runs a call-heavy program (recursive fib) instead of files
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wabbit.interp import interpret
+from wabbit.parse import parse
+
+DEFAULT_FILES = ['tests/Func/fib.wb', 'tests/Func/sqrt.wb', 'tests/Func/mandel.wb']
+
+CALLS = '''
+func fib(n int) int {
+    if n < 2 {
+        return 1;
+    }
+    return fib(n-1) + fib(n-2);
+}
+
+print fib(25);
+'''
+
+def bench(filename, engines, text=None, repeat=1):
+    if text is None:
+        with open(filename) as f:
+            text = f.read()
+    node = parse(text)
+
+    base = None
+    for engine in engines:
+        elapsed = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ret, env, stdout = interpret(node, engine)
+            t = time.perf_counter() - start
+            elapsed = t if elapsed is None else min(elapsed, t)
+
+        if base is None:
+            base = elapsed
+        print(f'{filename:32s} {engine:8s} {elapsed:8.3f}s {base / elapsed:6.1f}x')
+
+def main(args):
+    engines = ['tree', 'closure', 'vm']
+    if '--engines' in args:
+        i = args.index('--engines')
+        engines = args[i+1].split(',')
+        args = args[:i] + args[i+2:]
+
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    if '--calls' in args:
+        bench('<calls>', engines, CALLS, repeat)
+        return
+
+    for filename in args or DEFAULT_FILES:
+        bench(filename, engines, repeat=repeat)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Memory used by the model of a big program, made of the test programs
+# repeated, the time to build it with the checks of the node arguments
+# on and off, and the time to compare it with another parse of the same
+# text and of a text that differs at the end
+#
+#   scripts/bench_model.py [-n N] [--copies C] [file.wb ...]
+#
+# -n N         report the best of N runs
+# --copies C   repeat the input C times (default 50)
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit import model
+from wabbit.closure import walk
+from wabbit.model import Integer, Print
+from wabbit.parse import parse
+from timing import best
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def main(args):
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    copies = 50
+    if '--copies' in args:
+        i = args.index('--copies')
+        copies = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    text = ''
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            text += f.read() + '\n'
+    text *= copies
+
+    # the tokens are gone by the time parse returns, what's left is the
+    # model
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    program = parse(text, 'fast')
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(_.size_diff for _ in after.compare_to(before, 'filename'))
+    nodes = sum(1 for _ in walk(program))
+    print(f'{nodes} nodes, {size / 1e6:.1f}MB, {size / nodes:.1f} bytes/node')
+
+    for check in (True, False):
+        model.check_nodes(check)
+        t = best(lambda: parse(text, 'fast'), repeat)
+        print(f'{"checks " + ("on" if check else "off"):16s} {t:8.3f}s')
+
+    same = parse(text, 'fast')
+    other = parse(text, 'fast')
+    other.statements[-1] = Print(Integer(0))
+    for name, a, b in (('equal', program, same), ('not equal', program, other)):
+        # the first comparison may hash the trees, later ones don't
+        start = time.perf_counter()
+        assert (a == b) == (name == 'equal')
+        t = time.perf_counter() - start
+        print(f'{name + ", first":16s} {t:8.3f}s')
+        t = best(lambda: a == b, repeat)
+        print(f'{name + ", again":16s} {t:8.3f}s')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
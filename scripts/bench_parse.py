@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# Time the parsers against each other on a big input, made of the test
+# programs repeated
+#
+#   scripts/bench_parse.py [--parsers sly,fast] [-n N] [--copies C] [file.wb ...]
+#
+# -n N         report the best of N runs
+# --copies C   repeat the input C times (default 50)
+
+import glob
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.parse import parse
+from wabbit.tokenize import tokenize
+from timing import best
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def main(args):
+    parsers = ['sly', 'fast']
+    if '--parsers' in args:
+        i = args.index('--parsers')
+        parsers = args[i+1].split(',')
+        args = args[:i] + args[i+2:]
+
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    copies = 50
+    if '--copies' in args:
+        i = args.index('--copies')
+        copies = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    text = ''
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            text += f.read() + '\n'
+    text *= copies
+
+    ntokens = sum(1 for _ in tokenize(text))
+    print(f'{len(text.splitlines())} lines, {ntokens} tokens')
+
+    t = best(lambda: sum(1 for _ in tokenize(text)), repeat)
+    print(f'{"tokenize only":16s} {t:8.3f}s')
+
+    base = None
+    for parser in parsers:
+        t = best(lambda: parse(text, parser), repeat)
+        if base is None:
+            base = t
+        print(f'{parser:16s} {t:8.3f}s {base / t:6.1f}x {ntokens / t:12.0f} tokens/s')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
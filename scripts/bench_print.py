@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Output heavy programs built with wabbit.c: print through the buffered
+# writers of the C runtime, against the same C with every print turned
+# back into the printf call it replaces
+#
+#   scripts/bench_print.py [-n N] [--count C]
+#
+# -n N         report the best of N runs (default 3)
+# --count C    number of prints of the loops (default 2000000)
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.build import build_profile
+from wabbit.c import compile_c
+from timing import best
+
+LOOP = '''
+var i = 0;
+var x = 0.0;
+while i < {count} {{
+    {body}
+    i = i + 1;
+    x = x + 0.37;
+}}
+'''
+
+PROGRAMS = [
+    ('int', 'print i;'),
+    ('float', 'print x;'),
+    ('char', "print 'x';"),
+    ('bool', 'print i < 100;'),
+]
+
+PRINTF = {
+    'int': r'printf("%d\n", {});',
+    'float': r'printf("%.6f\n", {});',
+    'char': r'printf("%c", {});',
+    'bool': r'printf({} ? "true\n": "false\n");',
+}
+
+def with_printf(code):
+    for type, call in PRINTF.items():
+        code = re.sub(rf'^_print_{type}\((.*)\);$', lambda m: call.format(m.group(1)), code, flags=re.M)
+    return code
+
+def main(args):
+    repeat = 3
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    count = 2000000
+    if '--count' in args:
+        i = args.index('--count')
+        count = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    programs = [(name, LOOP.format(count=count, body=body)) for name, body in PROGRAMS]
+    with open(os.path.join(ROOT, 'tests/Func/mandel.wb')) as f:
+        mandel = f.read()
+    mandel = re.sub(r'(const (width|height) = )([\d.]+)', lambda m: f'{m.group(1)}{float(m.group(3)) * 16}', mandel)
+    mandel = mandel.replace('threshhold = 1000', 'threshhold = 10')
+    programs.append(('mandel x16', mandel))
+
+    print(f'{"program":12s} {"output":>8s} {"printf":>9s} {"buffered":>9s}')
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['WABBIT_CACHE_DIR'] = tmp
+        out = os.path.join(tmp, 'out')
+        for name, text in programs:
+            times = []
+            outputs = []
+            for code in (with_printf(compile_c(text)), compile_c(text)):
+                c = os.path.join(tmp, f'{len(times)}.c')
+                with open(c, 'w') as f:
+                    f.write(code)
+                build_profile(c, c[:-2], 'release')
+
+                def run():
+                    with open(out, 'w') as f:
+                        subprocess.run([c[:-2]], stdout=f, check=True)
+                times.append(best(run, repeat))
+                with open(out, 'rb') as f:
+                    outputs.append(f.read())
+
+            assert outputs[0] == outputs[1], name
+            print(f'{name:12s} {len(outputs[0]) / 1e6:7.1f}M {times[0] * 1000:7.1f}ms '
+                  f'{times[1] * 1000:7.1f}ms {times[0] / times[1]:5.1f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
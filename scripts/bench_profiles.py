@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# mandel.wb built with each of the build profiles of wabbit.build: time
+# to build (without the cache) and to run
+#
+#   scripts/bench_profiles.py [-n N] [--scale S] [--native] [file.wb]
+#
+# -n N         report the best of N runs (default 5)
+# --scale S    multiply the width and height of mandel.wb by S (default 8)
+# --native     also build the profiles with -march=native
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.build import PROFILES, build_profile
+from wabbit.c import compile_c
+from timing import best
+
+DEFAULT_FILE = os.path.join(ROOT, 'tests/Func/mandel.wb')
+
+def main(args):
+    repeat = 5
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    scale = 8
+    if '--scale' in args:
+        i = args.index('--scale')
+        scale = float(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    natives = [False]
+    if '--native' in args:
+        args.remove('--native')
+        natives.append(True)
+
+    with open(args[0] if args else DEFAULT_FILE) as f:
+        text = f.read()
+    text = re.sub(r'(const (width|height) = )([\d.]+)', lambda m: f'{m.group(1)}{float(m.group(3)) * scale}', text)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        c = os.path.join(tmp, 'prog.c')
+        exe = os.path.join(tmp, 'prog')
+        with open(c, 'w') as f:
+            compile_c(text, f)
+
+        print(f'{"profile":16s} {"build":>9s} {"run":>9s}')
+        base = None
+        for native in natives:
+            for profile in PROFILES:
+                start = time.perf_counter()
+                build_profile(c, exe, profile, native, cache=False)
+                b = time.perf_counter() - start
+
+                t = best(lambda: subprocess.run([exe], stdout=subprocess.DEVNULL, check=True), repeat)
+                if base is None:
+                    base = t
+                name = profile + (' native' if native else '')
+                print(f'{name:16s} {b * 1000:7.0f}ms {t * 1000:7.1f}ms {base / t:5.2f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Time the startup of python3 -m wabbit.interp on a trivial program, with
+# and without the parser tables in the cache
+#
+#   scripts/bench_startup.py [-n N] [program]
+#
+# -n N     report the best of N runs (default 10)
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+PROGRAM = 'print 1;'
+
+def run(cmd, env):
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def bench(name, cmd, cache_dir, repeat):
+    elapsed = None
+    for _ in range(repeat):
+        if cache_dir is None:
+            # new empty cache every run
+            with tempfile.TemporaryDirectory() as tmp:
+                t = run(cmd, dict(os.environ, WABBIT_CACHE_DIR=tmp))
+        else:
+            t = run(cmd, dict(os.environ, WABBIT_CACHE_DIR=cache_dir))
+        elapsed = t if elapsed is None else min(elapsed, t)
+
+    print(f'{name:24s} {elapsed * 1000:8.1f}ms')
+
+def main(args):
+    repeat = 10
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    program = args[0] if args else PROGRAM
+    interp = [sys.executable, '-m', 'wabbit.interp', program]
+
+    with tempfile.TemporaryDirectory() as warm:
+        run(interp, dict(os.environ, WABBIT_CACHE_DIR=warm))
+
+        bench('python3 (no wabbit)', [sys.executable, '-c', 'pass'], warm, repeat)
+        bench('interp, cold cache', interp, None, repeat)
+        bench('interp, warm cache', interp, warm, repeat)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
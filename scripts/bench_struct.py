@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Struct heavy numeric code, the Complex math of tests/Type/mandel_struct.wb,
+# on the interpreter engines against the C backend.  mandel_struct.wb
+# itself uses enums, which the parser doesn't have, so in_mandelbrot()
+# returns an int here.
+#
+#   scripts/bench_struct.py [-n N] [--engines tree,closure,vm,c]
+#
+# -n N     report the best of N runs (default 1)
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.c import cc
+from wabbit.interp import interpret
+from wabbit.parse import parse
+from timing import best
+
+MANDEL = '''
+struct Complex {
+    real float;
+    imag float;
+}
+
+func add(a Complex, b Complex) Complex {
+    return Complex(a.real + b.real, a.imag + b.imag);
+}
+
+func mul(a Complex, b Complex) Complex {
+    return Complex(a.real * b.real - a.imag * b.imag,
+                   a.real * b.imag + b.real * a.imag);
+}
+
+func magnitude2(x Complex) float {
+    return x.real * x.real + x.imag * x.imag;
+}
+
+func in_mandelbrot(c Complex, limit int) int {
+    var z = Complex(0.0, 0.0);
+    var n = 0;
+    while n < limit {
+        z = add(mul(z, z), c);
+        if magnitude2(z) > 16.0 {
+            return n;
+        }
+        n = n + 1;
+    }
+    return -1;
+}
+
+const xmin = -2.0;
+const xmax = 1.0;
+const ymin = -1.5;
+const ymax = 1.5;
+const width = 80.0;
+const height = 40.0;
+const threshhold = 100;
+
+func mandel() int {
+     var dx = Complex((xmax - xmin)/width, 0.0);
+     var dy = Complex(0.0, -(ymax - ymin)/height);
+     var c  = Complex(xmin, ymax);
+
+     while c.imag >= ymin {
+         c.real = xmin;
+         while c.real < xmax {
+             if in_mandelbrot(c, threshhold) < 0 {
+                 print '*';
+             } else {
+                 print '.';
+             }
+             c = add(c, dx);
+         }
+         print '\\n';
+         c = add(c, dy);
+     }
+     return 0;
+}
+
+func main() int {
+    return mandel();
+}
+'''
+
+def main(args):
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    engines = ['tree', 'closure', 'vm', 'c']
+    if '--engines' in args:
+        i = args.index('--engines')
+        engines = args[i+1].split(',')
+        args = args[:i] + args[i+2:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['WABBIT_CACHE_DIR'] = tmp
+        exe = os.path.join(tmp, 'mandel')
+        cc(MANDEL, exe + '.c', 'release')
+
+        base = None
+        for engine in engines:
+            if engine == 'c':
+                f = lambda: subprocess.run([exe], stdout=subprocess.DEVNULL, check=True)
+            else:
+                node = parse(MANDEL)
+                f = lambda: interpret(node, engine)
+            t = best(f, repeat)
+            if base is None:
+                base = t
+            print(f'{engine:8s} {t * 1000:9.1f}ms {base / t:7.1f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Tokens per second of tokenize() against the sly WabbitLexer, on the
+# test programs repeated
+#
+#   scripts/bench_tokenize.py [-n N] [--copies C] [file.wb ...]
+#
+# -n N         report the best of N runs
+# --copies C   repeat the input C times (default 50)
+#
+# Also reports the memory per token of a list of tokens and of a
+# TokenBuffer.
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.tokenize import tokenize, TokenBuffer, WabbitLexer
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def sly_tokenize(text):
+    return WabbitLexer().tokenize(text)
+
+def buffer_tokenize(text):
+    return TokenBuffer(text).kinds
+
+LEXERS = {
+    'sly': sly_tokenize,
+    'regex': tokenize,
+    'buffer': buffer_tokenize,
+}
+
+def memory(f):
+    '''bytes allocated by f() that are still in use after it'''
+    tracemalloc.start()
+    try:
+        result = f()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def main(args):
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    copies = 50
+    if '--copies' in args:
+        i = args.index('--copies')
+        copies = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    text = ''
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            text += f.read() + '\n'
+    text *= copies
+
+    print(f'{len(text.splitlines())} lines, {len(text)} chars')
+
+    base = None
+    for name, lexer in LEXERS.items():
+        elapsed = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ntokens = sum(1 for _ in lexer(text))
+            t = time.perf_counter() - start
+            elapsed = t if elapsed is None else min(elapsed, t)
+
+        if base is None:
+            base = elapsed
+        print(f'{name:8s} {ntokens:8d} tokens {elapsed:8.3f}s {ntokens / elapsed:12.0f} tokens/s {base / elapsed:6.1f}x')
+
+    print()
+    print(f'{"list of tokens":16s} {memory(lambda: list(tokenize(text))) / ntokens:8.1f} bytes/token')
+    print(f'{"TokenBuffer":16s} {memory(lambda: TokenBuffer(text)) / ntokens:8.1f} bytes/token')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Per-node cost of dispatching on the node class: getattr with the
+# method name built for every node, as the walkers used to do, against
+# the dispatch tables of wabbit.visitor.NodeVisitor.  The visit methods
+# do nothing, so the numbers are the dispatch alone.
+#
+#   scripts/bench_visitor.py [-n N] [file.wb ...]
+#
+# -n N     report the best of N runs (default 5)
+
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.closure import walk
+from wabbit.model import Node
+from wabbit.parse import parse
+from wabbit.visitor import NodeVisitor
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+
+class Getattr:
+    def visit(self, node):
+        m = getattr(self, f'visit_{node.__class__.__name__}')
+        return m(node)
+
+class Table(NodeVisitor):
+    pass
+
+class Fallback(NodeVisitor):
+    # every node class falls back to visit_Node through the MRO
+    def visit_Node(self, node):
+        pass
+
+def nothing(self, node):
+    pass
+
+# one visit_ method per node class, like the real walkers
+for cls in Node.__subclasses__():
+    setattr(Getattr, f'visit_{cls.__name__}', nothing)
+    setattr(Table, f'visit_{cls.__name__}', nothing)
+
+
+def main(args):
+    repeat = 5
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    nodes = []
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            nodes.extend(walk(parse(f.read(), 'fast')))
+    nodes *= max(1, 1000000 // len(nodes))
+    print(f'{len(nodes)} nodes')
+
+    base = None
+    for visitor in (Getattr(), Table(), Fallback()):
+        visit = visitor.visit
+        elapsed = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for n in nodes:
+                visit(n)
+            t = time.perf_counter() - start
+            elapsed = t if elapsed is None else min(elapsed, t)
+        if base is None:
+            base = elapsed
+        name = visitor.__class__.__name__.lower()
+        print(f'{name:10s} {elapsed / len(nodes) * 1e9:6.1f}ns/node {base / elapsed:6.2f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
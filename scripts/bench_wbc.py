@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# Parsing a big file, made of the test programs repeated, against
+# loading its model from the .wbc cache
+#
+#   scripts/bench_wbc.py [-n N] [--copies C] [file.wb ...]
+#
+# -n N         report the best of N runs
+# --copies C   repeat the input C times (default 50)
+
+import glob
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.parse import parse
+from wabbit.wbc import dumps, loads
+from timing import best
+
+DEFAULT_FILES = glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+
+def main(args):
+    repeat = 1
+    if '-n' in args:
+        i = args.index('-n')
+        repeat = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    copies = 50
+    if '--copies' in args:
+        i = args.index('--copies')
+        copies = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    text = ''
+    for filename in args or DEFAULT_FILES:
+        with open(filename) as f:
+            text += f.read() + '\n'
+    text *= copies
+
+    model = parse(text, 'fast')
+    data = dumps(model)
+    print(f'source {len(text) / 1e6:.2f}MB, .wbc {len(data) / 1e6:.2f}MB, '
+          f'pickle {len(pickle.dumps(model)) / 1e6:.2f}MB')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['WABBIT_CACHE_DIR'] = tmp
+        source = pathlib.Path(tmp, 'big.wb')
+        source.write_text(text)
+
+        rows = [
+            ('parse, sly', lambda: parse(source, 'sly', cache=False)),
+            ('parse, fast', lambda: parse(source, 'fast', cache=False)),
+            ('dumps', lambda: dumps(model)),
+            ('loads', lambda: loads(data)),
+            ('cached parse', lambda: parse(source)),
+        ]
+        parse(source)
+        for name, f in rows:
+            t = best(f, repeat)
+            print(f'{name:16s} {t * 1000:8.1f}ms')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
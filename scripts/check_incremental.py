@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Random edits of the test programs with wabbit.incremental, checked
+# after every edit against parsing the whole text with
+# parse(text, parser='fast'): the same model, or the same SyntaxError
+#
+#   scripts/check_incremental.py [--seed S] [-n N] [file.wb ...]
+#
+# --seed S     random seed (default 0)
+# -n N         edits per file (default 300)
+
+import contextlib
+import glob
+import io
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.incremental import Document
+from wabbit.parse import parse
+
+# the programs test.sh runs, the ones that parse: no enums
+DEFAULT_FILES = [
+    _ for _ in sorted(glob.glob(os.path.join(ROOT, 'tests/Script/*.wb')) + glob.glob(os.path.join(ROOT, 'tests/Func/*.wb'))
+                      + glob.glob(os.path.join(ROOT, 'tests/Type/*.wb')))
+    if '::' not in open(_).read()
+]
+
+# pieces of wabbit to insert, whole statements and stray tokens
+SNIPPETS = [
+    '\n', ' ', ';', '{', '}', '(', ')', '//', '/*', '*/', "'", "'a'", 'x',
+    '1', '2.5', '+', '-', '*', '<', '=', '==', ',', '.', 'int', 'print ',
+    'var ', 'func ', 'while ', 'if ', 'else ', 'return ', 'break;',
+    'print 1;\n', 'var y = 3;\n', 'func f(a int) int { return a; }\n',
+    'struct S { a int; }\n', 'while x < 2 { x = x + 1; }\n',
+]
+
+def result(f):
+    '''the model f() returns, or the message of its SyntaxError'''
+    try:
+        return f()
+    except SyntaxError as e:
+        return f'SyntaxError: {e}'
+
+def random_edit(rng, text):
+    offset = rng.randrange(len(text) + 1)
+    deleted = min(rng.choice([0, 0, 1, 1, 2, 5, 20, 200]), len(text) - offset)
+    if rng.random() < 0.2:
+        # some of the text itself, as if moved or pasted
+        start = rng.randrange(len(text) + 1)
+        inserted = text[start:start + rng.randrange(60)]
+    else:
+        inserted = ''.join(rng.choice(SNIPPETS) for _ in range(rng.choice([0, 1, 1, 2, 3])))
+    return offset, deleted, inserted
+
+def check_file(filename, rng, count):
+    with open(filename) as f:
+        text = f.read()
+
+    doc = Document(text)
+    edits = []
+    for _ in range(count):
+        edit = random_edit(rng, doc.text)
+        edits.append(edit)
+        got = result(lambda: doc.edit(*edit))
+        expected = result(lambda: parse(doc.text, parser='fast'))
+        if got != expected:
+            raise AssertionError(f'{filename}: edits {edits}\n  incremental {got}\n  full parse  {expected}')
+
+def main(args):
+    seed = 0
+    if '--seed' in args:
+        i = args.index('--seed')
+        seed = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    count = 300
+    if '-n' in args:
+        i = args.index('-n')
+        count = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    rng = random.Random(seed)
+    files = args or DEFAULT_FILES
+    # the lexer prints illegal characters, the edits make plenty
+    with contextlib.redirect_stdout(io.StringIO()):
+        for filename in files:
+            check_file(filename, rng, count)
+    print(f'ok, {len(files) * count} edits')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# The int and float writers of the C runtime (wabbit.c.RUNTIME) against
+# printf with the formats print used, "%d\n" and "%.6f\n": special
+# values, then random ints and doubles, with the runtime built -O0, -O2
+# and -O2 -march=native
+#
+#   scripts/check_print.py [-n N]
+#
+# -n N         random values per build (default 1000000)
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.build import build_profile
+from wabbit.c import RUNTIME
+
+BUILDS = [
+    ('debug', False),
+    ('release', False),
+    ('release', True),
+]
+
+# the doubles are any bits, dyadic fractions (exact ties), integers
+# scaled down, and values near a multiple of 5e-7 (ties after rounding)
+CHECK = r'''
+#include <math.h>
+#include <stdint.h>
+#include <string.h>
+
+static uint64_t state = 88172645463325252ull;
+
+static uint64_t rnd(void) {
+    state ^= state << 13;
+    state ^= state >> 7;
+    state ^= state << 17;
+    return state;
+}
+
+static long bad;
+
+static void check(const char *want, int n, double x) {
+    if (_out_n != n || memcmp(_out, want, n)) {
+        if (bad++ < 10)
+            fprintf(stderr, "%.17g: printf %.*s, runtime %.*s\n", x, n - 1, want, _out_n ? _out_n - 1 : 0, _out);
+    }
+    _out_n = 0;
+}
+
+static void check_float(double x) {
+    char want[512];
+    int n = snprintf(want, sizeof want, "%.6f\n", x);
+    _print_float(x);
+    check(want, n, x);
+}
+
+static void check_int(int x) {
+    char want[64];
+    int n = snprintf(want, sizeof want, "%d\n", x);
+    _print_int(x);
+    check(want, n, x);
+}
+
+int main(int argc, char **argv) {
+    long count = atol(argv[1]), k;
+    double specials[] = {
+        0.0, -0.0, 1e9, -1e9, 999999999.9999995, 999999999.99999994, 1e300,
+        -1e-300, 5e-7, -5e-7, 4.9999999999999998e-7, 1.0 / 0.0, -1.0 / 0.0,
+        0.0 / 0.0, 0.5, 2.5e-6, 1.5e-6,
+    };
+    int ints[] = {0, -1, 1, 2147483647, -2147483647 - 1};
+
+    for (k = 0; k < sizeof specials / sizeof *specials; k++)
+        check_float(specials[k]);
+    for (k = 0; k < sizeof ints / sizeof *ints; k++)
+        check_int(ints[k]);
+
+    for (k = 0; k < count; k++) {
+        uint64_t r = rnd();
+        double x;
+        switch (k % 5) {
+        case 0:
+            memcpy(&x, &r, 8);
+            break;
+        case 1:
+            x = ldexp((double)(int64_t)(r >> 11), -(int)(rnd() % 80));
+            break;
+        case 2:
+            x = (double)(int64_t)r / (double)(1ull << (rnd() % 63));
+            break;
+        case 3:
+            x = ((int64_t)(r % 2000000001) - 1000000000) / 1e6 + ((int)(rnd() % 3) - 1) * 5e-7;
+            break;
+        default:
+            x = ((int64_t)(r % 20000000001ll) - 10000000000ll) / 1e9 / (1 + rnd() % 1000);
+            break;
+        }
+        check_float(x);
+        check_int((int)r);
+    }
+    printf("%ld\n", bad);
+    return 0;
+}
+'''
+
+def main(args):
+    count = 1000000
+    if '-n' in args:
+        i = args.index('-n')
+        count = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        c = os.path.join(tmp, 'check.c')
+        with open(c, 'w') as f:
+            f.write(RUNTIME + CHECK)
+
+        for profile, native in BUILDS:
+            exe = os.path.join(tmp, f'check-{profile}-{native}')
+            build_profile(c, exe, profile, native, flags=['-lm'])
+            out = subprocess.run([exe, str(count)], capture_output=True, text=True, check=True)
+            name = profile + (' native' if native else '')
+            if int(out.stdout) != 0:
+                raise AssertionError(f'{name}: {out.stdout.strip()} values differ from printf\n{out.stderr}')
+            print(f'{name:16s} ok, {count} values')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
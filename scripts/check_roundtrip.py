@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# The encodings of the model against the model itself, on the models of
+# the test programs from both parsers: the flat tree of flat.py and the
+# binary .wbc of wbc.py have to decode to an equal model
+#
+#   scripts/check_roundtrip.py
+
+import contextlib
+import glob
+import io
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.flat import FlatTree
+from wabbit.parse import parse
+from wabbit.wbc import dumps, loads
+
+FILES = sorted(glob.glob(os.path.join(ROOT, 'tests/*/*.wb')))
+
+def check(model, what):
+    if FlatTree.from_model(model).to_model() != model:
+        raise AssertionError(f'{what}: the flat tree decodes to a different model')
+    if loads(dumps(model)) != model:
+        raise AssertionError(f'{what}: the .wbc decodes to a different model')
+
+def main(args):
+    count = 0
+    for filename in FILES:
+        with open(filename) as f:
+            text = f.read()
+        for parser in ('sly', 'fast'):
+            # the error tests don't all parse: fastparse raises on them, and
+            # sly may not recover; the illegal characters reported don't matter
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    model = parse(text, parser=parser, cache=False)
+            except SyntaxError:
+                continue
+            if model is None:
+                continue
+            check(model, f'{filename}, {parser} parser')
+            count += 1
+    print(f'ok, {count} models of {len(FILES)} files')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
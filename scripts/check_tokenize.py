@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# The chunked lexer of tokenize_file() against lexing the whole file at
+# once, on the test programs and on random token soups, read in chunks
+# of every size from 1 to 64 bytes: the same tokens, values, lines and
+# offsets, and the same illegal characters reported
+#
+#   scripts/check_tokenize.py [--seed S] [-n N]
+#
+# --seed S     random seed (default 0)
+# -n N         number of token soups (default 3000)
+
+import contextlib
+import glob
+import io
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from wabbit.tokenize import TokenBuffer, tokenize_bytes, tokenize_file
+
+FILES = sorted(glob.glob(os.path.join(ROOT, 'tests/*/*.wb')))
+
+# pieces of soup: tokens, and the starts and ends of the ones that span
+# chunks, comments and chars, on their own too
+PIECES = [
+    'x', 'while', 'print', '_a1', '12', '3.', '.5', '1.25', "'a'", "'\\n'",
+    "'\\''", "'", '/*', '*/', '/* a\n b */', '//', '// x\n', '/', '*',
+    '<=', '<', '=', '==', '!', '!=', '&&', '&', '||', '|', ';', '{', '}',
+    '(', ')', '.', ',', ' ', '  ', '\t', '\n', '\n\n  ', '$', 'é',
+    '€', '#',
+]
+
+def lex(f):
+    '''the tokens f() generates and the illegal characters it reports'''
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        tokens = list(f())
+    return tokens, out.getvalue()
+
+def compare(got, expected, what):
+    if got == expected:
+        return
+    (tokens, out), (expected_tokens, expected_out) = got, expected
+    for i, (a, b) in enumerate(zip(tokens + [None], expected_tokens + [None])):
+        if a != b:
+            raise AssertionError(f'{what}: token {i} is {a}, expected {b}')
+    raise AssertionError(f'{what}: reported {out!r}, expected {expected_out!r}')
+
+def check(data, name):
+    expected = lex(lambda: tokenize_bytes(data))
+    compare(lex(lambda: TokenBuffer(data)), expected, f'{name}, TokenBuffer')
+    for size in range(1, 65):
+        got = lex(lambda: tokenize_file(io.BytesIO(data), size))
+        compare(got, expected, f'{name}, chunks of {size} bytes')
+
+def main(args):
+    seed = 0
+    if '--seed' in args:
+        i = args.index('--seed')
+        seed = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    count = 3000
+    if '-n' in args:
+        i = args.index('-n')
+        count = int(args[i+1])
+        args = args[:i] + args[i+2:]
+
+    for filename in FILES:
+        with open(filename, 'rb') as f:
+            check(f.read(), filename)
+
+    rng = random.Random(seed)
+    for _ in range(count):
+        soup = ''.join(rng.choice(PIECES) for _ in range(rng.randrange(1, 40)))
+        check(soup.encode('utf8'), repr(soup))
+    print(f'ok, {len(FILES)} files, {count} token soups')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+# Rewrite the output of a program run by the interpreters, from stdin,
+# the way the C backend prints it: the floats, repr() there, with "%.6f"
+#
+#   python3 -m wabbit.interp prog.wb | scripts/printf_floats.py
+
+import re
+import sys
+
+FLOAT = re.compile(r'-?(\d+\.\d*(e[-+]?\d+)?|\d+e[-+]?\d+|inf)')
+
+def main(args):
+    for line in sys.stdin:
+        text = line.rstrip('\n')
+        if FLOAT.fullmatch(text):
+            line = '%.6f\n' % float(text)
+        sys.stdout.write(line)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,18 @@
+# timing.py
+#
+# Timing for the bench_*.py scripts, which import it from this directory:
+#
+#     from timing import best
+#     t = best(lambda: parse(text), repeat)
+
+import time
+
+def best(f, repeat):
+    '''the shortest time of repeat calls of f(), in seconds'''
+    elapsed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        t = time.perf_counter() - start
+        elapsed = t if elapsed is None else min(elapsed, t)
+    return elapsed
@@ -2,6 +2,9 @@
 
 set -eo pipefail
 
+# check the arguments of every model node
+export WABBIT_CHECK=1
+
 echo "./script_models.py 2> /dev/null"
 ./script_models.py 2> /dev/null
 echo "./func_models.py 2> /dev/null"
@@ -9,6 +12,15 @@ echo "./func_models.py 2> /dev/null"
 echo "./type_models.py 2> /dev/null"
 ./type_models.py 2> /dev/null
 
+echo "scripts/check_tokenize.py"
+scripts/check_tokenize.py
+echo "scripts/check_incremental.py 2> /dev/null"
+scripts/check_incremental.py 2> /dev/null
+echo "scripts/check_print.py 2> /dev/null"
+scripts/check_print.py 2> /dev/null
+echo "scripts/check_roundtrip.py 2> /dev/null"
+scripts/check_roundtrip.py 2> /dev/null
+
 function test_file() {
     f=$1
     name=$(basename $f)
@@ -18,23 +30,42 @@ function test_file() {
     # just make sure we can parse and generate source
     echo "python3 -m wabbit.source $f > /dev/null"
     python3 -m wabbit.source $f > /dev/null
+    echo "python3 -m wabbit.fastparse --check $f 2> /dev/null"
+    python3 -m wabbit.fastparse --check $f 2> /dev/null
     echo "time SillyWabbit/wabbit.py $f 2> /dev/null > /tmp/$name-silly.out"
     time SillyWabbit/wabbit.py $f 2> /dev/null > /tmp/$name-silly.out
     echo
     echo "time python3 -m wabbit.interp $f 2> /dev/null > /tmp/$name-mattb.out"
     time python3 -m wabbit.interp $f 2> /dev/null > /tmp/$name-mattb.out
+    echo
+    echo "time python3 -m wabbit.interp --engine closure $f 2> /dev/null > /tmp/$name-mattb.closure.out"
+    time python3 -m wabbit.interp --engine closure $f 2> /dev/null > /tmp/$name-mattb.closure.out
+
+    echo
+    echo "time python3 -m wabbit.bytecode $f 2> /dev/null > /tmp/$name-mattb.vm.out"
+    time python3 -m wabbit.bytecode $f 2> /dev/null > /tmp/$name-mattb.vm.out
 
     echo
     echo "python3 -m wabbit.c < $f 2> /dev/null > /tmp/$name-mattb.c"
     python3 -m wabbit.c < $f 2> /dev/null > /tmp/$name-mattb.c
-    echo "clang /tmp/$name-mattb.c -o /tmp/$name-mattb.c.exe"
-    clang /tmp/$name-mattb.c -o /tmp/$name-mattb.c.exe
+    echo "python3 -m wabbit.build /tmp/$name-mattb.c /tmp/$name-mattb.c.exe"
+    python3 -m wabbit.build /tmp/$name-mattb.c /tmp/$name-mattb.c.exe
     echo "/tmp/$name-mattb.c.exe > /tmp/$name-mattb.c.out"
     /tmp/$name-mattb.c.exe > /tmp/$name-mattb.c.out
 
     echo
     echo "diff /tmp/$name-silly.out /tmp/$name-mattb.out"
     diff /tmp/$name-silly.out /tmp/$name-mattb.out
+    echo "diff /tmp/$name-silly.out /tmp/$name-mattb.closure.out"
+    diff /tmp/$name-silly.out /tmp/$name-mattb.closure.out
+    echo "diff /tmp/$name-silly.out /tmp/$name-mattb.vm.out"
+    diff /tmp/$name-silly.out /tmp/$name-mattb.vm.out
+
+    # the C runtime prints floats with "%.6f"
+    echo "scripts/printf_floats.py < /tmp/$name-silly.out > /tmp/$name-silly.c.out"
+    scripts/printf_floats.py < /tmp/$name-silly.out > /tmp/$name-silly.c.out
+    echo "diff /tmp/$name-silly.c.out /tmp/$name-mattb.c.out"
+    diff /tmp/$name-silly.c.out /tmp/$name-mattb.c.out
 }
 
 # everything except enums...  mandel last...
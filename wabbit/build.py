@@ -0,0 +1,216 @@
+# build.py
+#
+# Compile the C the backend generates into executables, with a cache of
+# the results: building a program that has been built before, with the
+# same compiler and flags, copies the executable out of the cache and
+# doesn't run the compiler at all.
+#
+#     build('prog.c', 'prog')
+#     build('prog.c', 'prog', flags=['-O2'])
+#
+# Or with one of the PROFILES, instead of the compiler's defaults:
+#
+#     debug      -O0 -g
+#     release    -O2
+#     fast       -O3
+#     pgo        -O2, profile guided: the program is built instrumented,
+#                run once on a training input (its arguments), and built
+#                again with the profile of that run
+#
+#     build_profile('prog.c', 'prog', 'release', native=True)
+#
+# native adds -march=native.  Profile guided builds work with clang
+# (-fprofile-instr-generate and llvm-profdata) and with gcc
+# (-fprofile-generate).
+#
+# Executables are stored in the cc/ directory of cache_dir(), named by
+# the hash of the C source, the compiler's path and --version, and the
+# flags, with -march=native as the CPU and features the compiler picks
+# for this host.  Using an executable touches it, and the least recently used
+# ones are removed when the cache is over $WABBIT_CC_CACHE_MB megabytes
+# (default 256).  A cache that can't be written is skipped.
+#
+#     python3 -m wabbit.build prog.c [prog] [--profile P] [--native] [flags ...]
+#     python3 -m wabbit.build --stats
+#     python3 -m wabbit.build --clear
+
+import functools
+import glob
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from .lrcache import cache_dir
+
+FORMAT = 1
+COMPILER = 'clang'
+
+PROFILES = {
+    'debug': ['-O0', '-g'],
+    'release': ['-O2'],
+    'fast': ['-O3'],
+    'pgo': ['-O2'],
+}
+
+def build_dir():
+    return os.path.join(cache_dir(), 'cc')
+
+def max_size():
+    return int(os.environ.get('WABBIT_CC_CACHE_MB', 256)) << 20
+
+@functools.lru_cache()
+def compiler_version(path):
+    return subprocess.run([path, '--version'], capture_output=True, text=True, check=True).stdout
+
+@functools.lru_cache()
+def native_target(path):
+    '''
+    What -march=native is on this host for the compiler path: the -m
+    options gcc expands it to, or clang's target cpu and features
+    '''
+    out = subprocess.run([path, '-###', '-march=native', '-x', 'c', '-c', os.devnull, '-o', os.devnull],
+                         capture_output=True, text=True).stderr
+    target = []
+    for line in out.splitlines():
+        try:
+            args = shlex.split(line)
+        except ValueError:
+            continue
+        for prev, arg in zip(['', *args], args):
+            if arg.startswith('-m') or prev in ('-target-cpu', '-target-feature'):
+                target.append(arg)
+    return ' '.join(target)
+
+def build_key(source, compiler, flags):
+    '''hash of everything the executable is built from, source is bytes'''
+    path = shutil.which(compiler) or compiler
+    h = hashlib.sha256()
+    for item in (FORMAT, path, compiler_version(path), *flags):
+        h.update(f'{item}\n'.encode())
+    if '-march=native' in flags:
+        h.update(f'{native_target(path)}\n'.encode())
+    h.update(source)
+    return h.hexdigest()
+
+def evict(directory, size):
+    '''remove the least recently used files until directory is under size bytes'''
+    try:
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(directory) if e.is_file()]
+    except OSError:
+        return
+
+    total = sum(_[1] for _ in entries)
+    for _, n, path in sorted(entries):
+        if total <= size:
+            break
+        try:
+            os.remove(path)
+            total -= n
+        except OSError:
+            pass
+
+def build(filename, exe, flags=(), compiler=COMPILER, cache=True, train=None):
+    '''
+    Compile the C file filename into the executable exe, returns True if
+    it came from the cache.  If train isn't None, it's a profile guided
+    build, trained by running the program with the arguments train.
+    '''
+    with open(filename, 'rb') as f:
+        source = f.read()
+
+    if cache:
+        key = flags if train is None else [*flags, '--pgo', *train]
+        cached = os.path.join(build_dir(), build_key(source, compiler, key))
+        try:
+            shutil.copy(cached, exe)
+            os.utime(cached)
+            return True
+        except OSError:
+            pass
+
+    if train is None:
+        subprocess.run([compiler, *flags, filename, '-o', exe], check=True)
+    else:
+        build_pgo(filename, exe, flags, compiler, train)
+
+    if cache:
+        tmp = f'{cached}.{os.getpid()}'
+        try:
+            os.makedirs(build_dir(), exist_ok=True)
+            shutil.copy(exe, tmp)
+            os.replace(tmp, cached)
+            evict(build_dir(), max_size())
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    return False
+
+def build_pgo(filename, exe, flags, compiler, train):
+    path = shutil.which(compiler) or compiler
+    clang = 'clang version' in compiler_version(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = os.path.join(tmp, 'default.profdata')
+        if clang:
+            generate = ['-fprofile-instr-generate']
+            use = [f'-fprofile-instr-use={profile}']
+        else:
+            # gcc names the profile after exe, so both builds write it
+            generate = [f'-fprofile-generate={tmp}']
+            use = [f'-fprofile-use={tmp}']
+
+        subprocess.run([compiler, *flags, *generate, filename, '-o', exe], check=True)
+        env = dict(os.environ, LLVM_PROFILE_FILE=os.path.join(tmp, '%p.profraw'))
+        subprocess.run([exe, *train], env=env, stdout=subprocess.DEVNULL, check=True)
+        if clang:
+            # llvm-profdata from the same toolchain if it's there
+            profdata = os.path.join(os.path.dirname(path), 'llvm-profdata')
+            if not os.path.exists(profdata):
+                profdata = 'llvm-profdata'
+            subprocess.run([profdata, 'merge', '-o', profile, *glob.glob(os.path.join(tmp, '*.profraw'))], check=True)
+        subprocess.run([compiler, *flags, *use, filename, '-o', exe], check=True)
+
+def build_profile(filename, exe, profile=None, native=False, train=(), flags=(), compiler=COMPILER, cache=True):
+    '''build() with the flags of one of the PROFILES, if any, then flags'''
+    flags = [*(PROFILES[profile] if profile else ()), *(['-march=native'] if native else []), *flags]
+    return build(filename, exe, flags, compiler, cache, train if profile == 'pgo' else None)
+
+
+def main(args):
+    if args == ['--clear']:
+        shutil.rmtree(build_dir(), ignore_errors=True)
+        return
+
+    if args == ['--stats']:
+        sizes = []
+        if os.path.isdir(build_dir()):
+            sizes = [e.stat().st_size for e in os.scandir(build_dir()) if e.is_file()]
+        print(f'{build_dir()}: {len(sizes)} executables, {sum(sizes) / (1 << 20):.1f}MB of {max_size() >> 20}MB')
+        return
+
+    profile = None
+    if '--profile' in args:
+        i = args.index('--profile')
+        profile = args[i+1]
+        args = args[:i] + args[i+2:]
+
+    native = '--native' in args
+    if native:
+        args.remove('--native')
+
+    filename = args[0]
+    exe = os.path.splitext(filename)[0]
+    if len(args) > 1 and not args[1].startswith('-'):
+        exe = args[1]
+        args = args[1:]
+
+    build_profile(filename, exe, profile, native, flags=args[1:])
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
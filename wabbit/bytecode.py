@@ -0,0 +1,714 @@
+# bytecode.py
+#
+# Compile Wabbit programs to a compact register-based bytecode and run
+# them on a small virtual machine.
+#
+# Every function (plus the top-level code, which becomes the function
+# '<module>') is compiled to a flat array of fixed-width instructions:
+#
+#     op, a, b, c
+#
+# The operands are numbered slots ("registers") in the function's frame,
+# indices into the program constants pool, global slots, jump targets,
+# etc., depending on the opcode.  Local variables are assigned a frame
+# slot at compile time, so there are no name lookups at runtime.
+# Temporaries are allocated in the slots above the locals.
+#
+# The VM runs all functions in a single dispatch loop with an explicit
+# stack of frames, so Wabbit calls do not recurse in Python and
+# break/continue/return are plain jumps.
+#
+# A compiled Program can be written to disk and loaded again:
+#
+#     python3 -m wabbit.bytecode -o prog.wbx prog.wb
+#     python3 -m wabbit.bytecode prog.wbx
+#     python3 -m wabbit.bytecode --dis prog.wb
+
+import marshal
+import os.path
+import pathlib
+import sys
+from array import array
+
+from .model import *
+from .output import stream_stdout
+from .parse import parse
+from .visitor import NodeVisitor
+
+MAGIC = b'WBX\x00'
+VERSION = 1
+
+# opcodes, roughly in order of how hot they are in the dispatch loop
+OPCODES = [
+    'MOVE',      # R[a] = R[b]
+    'JMPF',      # if not R[a]: pc = b
+    'LOADG',     # R[a] = G[b]
+    'ADD',       # R[a] = R[b] + R[c]
+    'ADDK',      # R[a] = R[b] + K[c]
+    'SUB',
+    'SUBK',
+    'MUL',
+    'MULK',
+    'LT',
+    'LTK',
+    'GT',
+    'GTK',
+    'LE',
+    'LEK',
+    'GE',
+    'GEK',
+    'EQ',
+    'EQK',
+    'NE',
+    'NEK',
+    'JMP',       # pc = a
+    'LOADK',     # R[a] = K[b]
+    'CALL',      # R[a] = functions[b](R[c], R[c+1], ...)
+    'RET',       # return R[a]
+    'RETN',      # return None
+    'PRINT',     # print R[a]
+    'STOREG',    # G[a] = R[b]
+    'DIV',       # R[a] = R[b] / R[c]  (integer division for ints)
+    'DIVK',
+    'NEG',       # R[a] = -R[b]
+    'NOT',       # R[a] = not R[b]
+    'JMPT',      # if R[a]: pc = b
+    'LOADU',     # R[a] = ()
+    'GETATTR',   # R[a] = R[b][K[c]]
+    'SETATTR',   # R[a][K[b]] = R[c]
+    'NEWSTRUCT', # R[a] = structs[b](R[c], R[c+1], ...)
+]
+
+for _i, _name in enumerate(OPCODES):
+    globals()[_name] = _i
+
+_binops = {
+    '+': ADD, '-': SUB, '*': MUL, '/': DIV,
+    '<': LT, '>': GT, '<=': LE, '>=': GE, '==': EQ, '!=': NE,
+}
+
+# ops with a constant right hand side, op -> op with K
+_kops = {
+    ADD: ADDK, SUB: SUBK, MUL: MULK, DIV: DIVK,
+    LT: LTK, GT: GTK, LE: LEK, GE: GEK, EQ: EQK, NE: NEK,
+}
+
+# ops where we can swap the operands to get the constant on the right
+_commutative = {ADD, MUL, EQ, NE}
+
+# default values for 'var x type;'
+_defaults = {
+    'int': 0,
+    'float': 0.0,
+    'bool': False,
+    'char': '',
+}
+
+_literals = (Integer, Float, Bool, Char)
+
+
+class Function:
+    def __init__(self, name, nargs, nregs=0, code=None):
+        self.name = name
+        self.nargs = nargs
+        self.nregs = nregs
+        self.code = code if code is not None else array('i')
+
+    def __repr__(self):
+        return f'Function({self.name}, nargs={self.nargs}, nregs={self.nregs})'
+
+
+class Program:
+    def __init__(self, consts, globals, functions, structs, main=-1):
+        self.consts = consts        # constants pool
+        self.globals = globals      # global variable names, by slot
+        self.functions = functions  # functions[0] is the top-level code
+        self.structs = structs      # (name, field names) by index
+        self.main = main            # index of main() or -1
+
+    def dump(self, file):
+        functions = [(f.name, f.nargs, f.nregs, f.code.tobytes()) for f in self.functions]
+        data = (self.consts, self.globals, functions, self.structs, self.main)
+        file.write(MAGIC + bytes([VERSION]) + marshal.dumps(data))
+
+    @classmethod
+    def load(cls, file):
+        data = file.read()
+        if data[:4] != MAGIC or len(data) < 5:
+            raise ValueError('not a wabbit bytecode file')
+        if data[4] != VERSION:
+            raise ValueError(f'bytecode version {data[4]}, expected {VERSION}')
+        try:
+            consts, names, functions, structs, main = marshal.loads(data[5:])
+        except (EOFError, TypeError, ValueError):
+            raise ValueError('bad bytecode data') from None
+        funcs = []
+        for name, nargs, nregs, code in functions:
+            a = array('i')
+            a.frombytes(code)
+            funcs.append(Function(name, nargs, nregs, a))
+        return cls(consts, names, funcs, structs, main)
+
+
+def pure(node):
+    '''True if evaluating node can't change the value of a local variable'''
+    if isinstance(node, (Name, Unit) + _literals):
+        return True
+    if isinstance(node, BinOp):
+        return pure(node.left) and pure(node.right)
+    if isinstance(node, UnaOp):
+        return pure(node.arg)
+    if isinstance(node, Attribute):
+        return pure(node.name)
+    if isinstance(node, Call):
+        # calls get their own frame, only globals can change
+        return all(pure(_) for _ in node.args)
+    return False
+
+
+class BytecodeCompiler(NodeVisitor):
+    def __init__(self):
+        self.consts = []
+        self.const_index = {}
+        self.globals = []
+        self.global_index = {}
+        self.functions = []
+        self.function_index = {}
+        self.structs = []
+        self.struct_index = {}
+
+        # state of the function being compiled
+        self.func = None
+        self.scopes = None
+        self.loops = None
+        self.top = self.vtop = 0
+        self.module = None
+
+    def compile_program(self, node):
+        # functions and structs may be referenced before their definition,
+        # so number them up front
+        for n in node.statements:
+            if isinstance(n, Func):
+                self.function_index[n.name.value] = len(self.function_index) + 1
+            elif isinstance(n, Struct):
+                self.struct_index[n.name.value] = len(self.structs)
+                self.structs.append((n.name.value, tuple(_.name.value for _ in n.fields)))
+
+        self.functions = [None] * (len(self.function_index) + 1)
+
+        module = self.begin_function('<module>', [])
+        self.module = self.func
+        for n in node.statements:
+            self.statement(n)
+        self.emit(RETN)
+        self.functions[0] = self.end_function(module)
+
+        return Program(
+            self.consts, self.globals, self.functions, self.structs,
+            self.function_index.get('main', -1),
+        )
+
+    # -- function / frame bookkeeping
+
+    def begin_function(self, name, args):
+        saved = self.func, self.scopes, self.top, self.vtop, self.loops
+
+        self.func = Function(name, len(args))
+        self.scopes = [{}]
+        self.loops = []
+        self.top = self.vtop = 0
+        for arg in args:
+            self.scopes[-1][arg] = self.alloc()
+        self.vtop = self.top
+
+        return saved
+
+    def end_function(self, saved):
+        func = self.func
+        self.func, self.scopes, self.top, self.vtop, self.loops = saved
+        return func
+
+    def alloc(self):
+        r = self.top
+        self.top += 1
+        if self.top > self.func.nregs:
+            self.func.nregs = self.top
+        return r
+
+    def target(self, dest):
+        return self.alloc() if dest is None else dest
+
+    def emit(self, op, a=0, b=0, c=0):
+        self.func.code.extend((op, a, b, c))
+        return len(self.func.code) // 4 - 1
+
+    def patch(self, pc, target):
+        # jump targets are always in operand 'b', except JMP which uses 'a'
+        i = pc * 4
+        if self.func.code[i] == JMP:
+            self.func.code[i+1] = target
+        else:
+            self.func.code[i+2] = target
+
+    @property
+    def pc(self):
+        return len(self.func.code) // 4
+
+    def const(self, value):
+        # key on the type too, so 1, 1.0 and true are different constants
+        key = (type(value), value)
+        i = self.const_index.get(key)
+        if i is None:
+            i = self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return i
+
+    def global_slot(self, name):
+        i = self.global_index.get(name)
+        if i is None:
+            i = self.global_index[name] = len(self.globals)
+            self.globals.append(name)
+        return i
+
+    def lookup(self, name):
+        '''Returns (True, slot) for locals, (False, global slot) for globals'''
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return True, scope[name]
+        return False, self.global_slot(name)
+
+    def push_scope(self):
+        self.scopes.append({})
+        saved = self.top, self.vtop
+        self.vtop = self.top
+        return saved
+
+    def pop_scope(self, saved):
+        self.scopes.pop()
+        self.top, self.vtop = saved
+
+    # -- statements
+
+    def statement(self, node):
+        r = self.visit(node)
+        # release temporaries, keeping declared variables
+        self.top = self.vtop
+        return r
+
+    def statements(self, statements):
+        r = None
+        for n in statements:
+            r = self.statement(n)
+        return r
+
+    def visit(self, node, dest=None):
+        return self.visit_table[node.__class__](self, node, dest)
+
+    def visit_Block(self, node, dest=None):
+        saved = self.push_scope()
+        self.statements(node.statements)
+        self.pop_scope(saved)
+
+    def visit_Compound(self, node, dest=None):
+        dest = self.target(dest)
+        saved = self.push_scope()
+        r = self.statements(node.statements)
+        if r is not None and r != dest:
+            self.emit(MOVE, dest, r)
+        self.pop_scope(saved)
+        return dest
+
+    def declare(self, node):
+        name = node.name.value
+
+        # top-level declarations go in the global scope
+        if self.func is self.module and len(self.scopes) == 1:
+            if node.arg is not None:
+                r = self.visit(node.arg)
+            else:
+                r = self.default(node.type)
+            self.emit(STOREG, self.global_slot(name), r)
+            return
+
+        # grab the slot before visiting the value, the name isn't in scope
+        # until after the value is computed (var x = x + 1;)
+        slot = self.alloc()
+        self.vtop = self.top
+        if node.arg is not None:
+            self.visit_into(node.arg, slot)
+        else:
+            self.visit_into(node.type, slot)
+        self.scopes[-1][name] = slot
+
+    def visit_Var(self, node, dest=None):
+        self.declare(node)
+
+    def visit_Const(self, node, dest=None):
+        self.declare(node)
+
+    def default(self, node, dest=None):
+        dest = self.target(dest)
+        if node.type == 'unit':
+            self.emit(LOADU, dest)
+        else:
+            self.emit(LOADK, dest, self.const(_defaults[node.type]))
+        return dest
+
+    visit_Type = default
+
+    def visit_into(self, node, dest):
+        # only pass dest down where the value is written as the last step
+        if isinstance(node, BinOp) and node.op in ('&&', '||'):
+            r = self.visit(node)
+        else:
+            r = self.visit(node, dest)
+        if r != dest:
+            self.emit(MOVE, dest, r)
+
+    def visit_Assign(self, node, dest=None):
+        if isinstance(node.name, Attribute):
+            value = self.visit(node.arg)
+            obj = self.visit(node.name.name)
+            self.emit(SETATTR, obj, self.const(node.name.attr), value)
+            return
+
+        local, slot = self.lookup(node.name.value)
+        if local:
+            self.visit_into(node.arg, slot)
+        else:
+            self.emit(STOREG, slot, self.visit(node.arg))
+
+    def visit_Print(self, node, dest=None):
+        self.emit(PRINT, self.visit(node.arg))
+
+    def visit_If(self, node, dest=None):
+        cond = self.visit(node.cond)
+        jmp_else = self.emit(JMPF, cond)
+        self.top = self.vtop
+        self.visit(node.block)
+        if node.eblock is not None:
+            jmp_end = self.emit(JMP)
+            self.patch(jmp_else, self.pc)
+            self.visit(node.eblock)
+            self.patch(jmp_end, self.pc)
+        else:
+            self.patch(jmp_else, self.pc)
+
+    def visit_While(self, node, dest=None):
+        start = self.pc
+        cond = self.visit(node.cond)
+        breaks = [self.emit(JMPF, cond)]
+        self.top = self.vtop
+        self.loops.append((start, breaks))
+        self.visit(node.block)
+        self.emit(JMP, start)
+        self.loops.pop()
+        for pc in breaks:
+            self.patch(pc, self.pc)
+
+    def visit_Break(self, node, dest=None):
+        self.loops[-1][1].append(self.emit(JMP))
+
+    def visit_Continue(self, node, dest=None):
+        self.emit(JMP, self.loops[-1][0])
+
+    def visit_Func(self, node, dest=None):
+        saved = self.begin_function(node.name.value, [_.name.value for _ in node.args])
+        self.statements(node.block.statements)
+        self.emit(RETN)
+        self.functions[self.function_index[node.name.value]] = self.end_function(saved)
+
+    def visit_Struct(self, node, dest=None):
+        # numbered in compile_program
+        pass
+
+    def visit_Return(self, node, dest=None):
+        self.emit(RET, self.visit(node.value))
+
+    # -- expressions
+
+    def visit_Name(self, node, dest=None):
+        local, slot = self.lookup(node.value)
+        if local:
+            if dest is not None and dest != slot:
+                self.emit(MOVE, dest, slot)
+                return dest
+            return slot
+        dest = self.target(dest)
+        self.emit(LOADG, dest, slot)
+        return dest
+
+    def visit_literal(self, node, dest=None):
+        dest = self.target(dest)
+        value = node.unescape() if isinstance(node, Char) else node.value
+        self.emit(LOADK, dest, self.const(value))
+        return dest
+
+    visit_Integer = visit_Float = visit_Bool = visit_Char = visit_literal
+
+    def visit_Unit(self, node, dest=None):
+        dest = self.target(dest)
+        self.emit(LOADU, dest)
+        return dest
+
+    def visit_UnaOp(self, node, dest=None):
+        if node.op == '+':
+            return self.visit(node.arg, dest)
+        arg = self.visit(node.arg)
+        dest = self.target(dest)
+        self.emit(NEG if node.op == '-' else NOT, dest, arg)
+        return dest
+
+    def visit_BinOp(self, node, dest=None):
+        if node.op in ('&&', '||'):
+            # short-circuit eval, left value is the result if it decides
+            dest = self.target(dest)
+            self.visit_into(node.left, dest)
+            jmp = self.emit(JMPF if node.op == '&&' else JMPT, dest)
+            self.visit_into(node.right, dest)
+            self.patch(jmp, self.pc)
+            return dest
+
+        op = _binops[node.op]
+        left, right = node.left, node.right
+        if op in _commutative and isinstance(left, _literals) and not isinstance(right, _literals):
+            left, right = right, left
+
+        a = self.visit(left)
+        if a < self.vtop and not pure(right):
+            # left is a variable that evaluating right could change
+            self.emit(MOVE, self.alloc(), a)
+            a = self.top - 1
+
+        if isinstance(right, _literals):
+            value = right.unescape() if isinstance(right, Char) else right.value
+            b = self.const(value)
+            op = _kops[op]
+        else:
+            b = self.visit(right)
+
+        dest = self.target(dest)
+        self.emit(op, dest, a, b)
+        return dest
+
+    def visit_Call(self, node, dest=None):
+        name = node.name.value
+        base = self.top
+        for arg in node.args:
+            self.alloc()
+        for i, arg in enumerate(node.args):
+            self.visit_into(arg, base + i)
+
+        dest = self.target(dest)
+        if name in self.struct_index:
+            self.emit(NEWSTRUCT, dest, self.struct_index[name], base)
+        else:
+            self.emit(CALL, dest, self.function_index[name], base)
+        return dest
+
+    def visit_Attribute(self, node, dest=None):
+        obj = self.visit(node.name)
+        dest = self.target(dest)
+        self.emit(GETATTR, dest, obj, self.const(node.attr))
+        return dest
+
+
+class VM:
+    def __init__(self, program, stdout=None):
+        self.program = program
+        self.stdout = stdout if stdout is not None else []
+
+        _undefined = self._undefined = object()
+        self.globals = [_undefined] * len(program.globals)
+
+        # decode each function's code array into instruction tuples once
+        self.code = []
+        for f in program.functions:
+            c = f.code
+            self.code.append([tuple(c[i:i+4]) for i in range(0, len(c), 4)])
+
+    def run(self):
+        ret = self.call(0, [])
+        if self.program.main >= 0:
+            ret = self.call(self.program.main, [])
+        return ret
+
+    @property
+    def env(self):
+        return {
+            name: value
+            for name, value in zip(self.program.globals, self.globals)
+            if value is not self._undefined
+        }
+
+    def call(self, index, args):
+        functions = self.program.functions
+        structs = self.program.structs
+        allcode = self.code
+        K = self.program.consts
+        G = self.globals
+        out = self.stdout.append
+        stack = []
+
+        f = functions[index]
+        code = allcode[index]
+        R = [None] * f.nregs
+        R[:len(args)] = args
+        pc = 0
+
+        while True:
+            op, a, b, c = code[pc]
+            pc += 1
+
+            if op == MOVE:
+                R[a] = R[b]
+            elif op == JMPF:
+                if not R[a]:
+                    pc = b
+            elif op == LOADG:
+                R[a] = G[b]
+            elif op == ADD:
+                R[a] = R[b] + R[c]
+            elif op == ADDK:
+                R[a] = R[b] + K[c]
+            elif op == SUB:
+                R[a] = R[b] - R[c]
+            elif op == SUBK:
+                R[a] = R[b] - K[c]
+            elif op == MUL:
+                R[a] = R[b] * R[c]
+            elif op == MULK:
+                R[a] = R[b] * K[c]
+            elif op == LT:
+                R[a] = R[b] < R[c]
+            elif op == LTK:
+                R[a] = R[b] < K[c]
+            elif op == GT:
+                R[a] = R[b] > R[c]
+            elif op == GTK:
+                R[a] = R[b] > K[c]
+            elif op == LE:
+                R[a] = R[b] <= R[c]
+            elif op == LEK:
+                R[a] = R[b] <= K[c]
+            elif op == GE:
+                R[a] = R[b] >= R[c]
+            elif op == GEK:
+                R[a] = R[b] >= K[c]
+            elif op == EQ:
+                R[a] = R[b] == R[c]
+            elif op == EQK:
+                R[a] = R[b] == K[c]
+            elif op == NE:
+                R[a] = R[b] != R[c]
+            elif op == NEK:
+                R[a] = R[b] != K[c]
+            elif op == JMP:
+                pc = a
+            elif op == LOADK:
+                R[a] = K[b]
+            elif op == CALL:
+                f = functions[b]
+                frame = [None] * f.nregs
+                frame[:f.nargs] = R[c:c+f.nargs]
+                stack.append((code, pc, R, a))
+                code, pc, R = allcode[b], 0, frame
+            elif op == RET or op == RETN:
+                value = R[a] if op == RET else None
+                if not stack:
+                    return value
+                code, pc, R, dest = stack.pop()
+                R[dest] = value
+            elif op == PRINT:
+                out(R[a])
+            elif op == STOREG:
+                G[a] = R[b]
+            elif op == DIV or op == DIVK:
+                x = R[b]
+                y = R[c] if op == DIV else K[c]
+                if isinstance(x, int):
+                    # integer division
+                    R[a] = x // y
+                else:
+                    R[a] = x / y
+            elif op == NEG:
+                R[a] = -R[b]
+            elif op == NOT:
+                R[a] = not R[b]
+            elif op == JMPT:
+                if R[a]:
+                    pc = b
+            elif op == LOADU:
+                R[a] = UNIT
+            elif op == GETATTR:
+                R[a] = R[b][K[c]]
+            elif op == SETATTR:
+                R[a][K[b]] = R[c]
+            elif op == NEWSTRUCT:
+                fields = structs[b][1]
+                R[a] = dict(zip(fields, R[c:c+len(fields)]))
+            else:
+                raise RuntimeError(f'Bad opcode {op}')
+
+
+def compile_program(text_or_node):
+    node = text_or_node
+    if not isinstance(text_or_node, Node):
+        node = parse(text_or_node)
+    return BytecodeCompiler().compile_program(node)
+
+def run(program, stdout=None):
+    '''Run a Program, returns the same (ret, env, stdout) as interpret()'''
+    vm = VM(program, stdout)
+    ret = vm.run()
+    return ret, vm.env, vm.stdout
+
+def dis(program, file=sys.stdout):
+    print('consts:', program.consts, file=file)
+    print('globals:', program.globals, file=file)
+    print('structs:', program.structs, file=file)
+    for f in program.functions:
+        print(f'\n{f.name}: nargs={f.nargs} nregs={f.nregs}', file=file)
+        for pc in range(len(f.code) // 4):
+            op, a, b, c = f.code[pc*4:pc*4+4]
+            print(f'{pc:5d}  {OPCODES[op]:10s} {a:5d} {b:5d} {c:5d}', file=file)
+
+def main(args):
+    output = None
+    if '-o' in args:
+        i = args.index('-o')
+        output = args[i+1]
+        args = args[:i] + args[i+2:]
+
+    disassemble = '--dis' in args
+    if disassemble:
+        args.remove('--dis')
+
+    if args and os.path.isfile(args[0]) and args[0].endswith('.wbx'):
+        with open(args[0], 'rb') as file:
+            program = Program.load(file)
+    else:
+        if args:
+            if os.path.isfile(args[0]):
+                # a path, so parse() can use its cache
+                source = pathlib.Path(args[0])
+            else:
+                source = args[0]
+        else:
+            source = sys.stdin.read()
+        program = compile_program(source)
+
+    if output:
+        with open(output, 'wb') as file:
+            program.dump(file)
+        return
+
+    if disassemble:
+        dis(program)
+        return
+
+    with stream_stdout() as stdout:
+        run(program, stdout)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
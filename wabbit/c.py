@@ -129,20 +129,152 @@
 # problem related to incorrect programs. Assume that all programs
 # are fully correct with respect to their usage of types and names.
 
+import atexit
+import ctypes
+import hashlib
+import heapq
 import os.path
+import pathlib
+import shutil
 import sys
+import tempfile
+from types import SimpleNamespace
 
+from .build import build_profile
 from .model import *
 from .parse import parse
 from .scope import *
+from .visitor import NodeVisitor
 
 NOOP = '(void)0;\n'
 
-class TypeVisitor:
+# Emitted at the top of every program: Unit, and print's output, which
+# goes through a static buffer written out when it's full and at exit,
+# with a writer per type instead of printf.  The writers produce
+# exactly what printf does with the formats print used: "%d\n",
+# "%.6f\n", "%c".
+RUNTIME = r'''
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdbool.h>
+
+int *Unit() {
+    static int instance = 42;
+    return &instance;
+}
+
+/* print's output, written out when the buffer is full and at exit */
+
+#define _OUT_SIZE 65536
+static char _out[_OUT_SIZE];
+static int _out_n;
+
+void _wabbit_flush(void) {
+    fwrite(_out, 1, _out_n, stdout);
+    _out_n = 0;
+}
+
+static void _out_reserve(int n) {
+    if (_out_n + n > _OUT_SIZE)
+        _wabbit_flush();
+}
+
+static void _print_str(const char *s) {
+    while (*s) {
+        _out_reserve(1);
+        _out[_out_n++] = *s++;
+    }
+}
+
+static void _print_char(char c) {
+    _out_reserve(1);
+    _out[_out_n++] = c;
+}
+
+static void _print_bool(bool b) {
+    _print_str(b ? "true\n" : "false\n");
+}
+
+static void _print_digits(unsigned long long u) {
+    char tmp[20];
+    int i = 0;
+    do {
+        tmp[i++] = '0' + u % 10;
+        u /= 10;
+    } while (u);
+    while (i)
+        _out[_out_n++] = tmp[--i];
+}
+
+static void _print_int(int x) {
+    _out_reserve(12);
+    if (x < 0)
+        _out[_out_n++] = '-';
+    _print_digits(x < 0 ? 0u - (unsigned)x : (unsigned)x);
+    _out[_out_n++] = '\n';
+}
+
+static void _print_float(double x) {
+    double c, hi, lo, p, e, d;
+    unsigned long long r, frac;
+    int i, neg = x < 0 || (x == 0 && 1 / x < 0);
+
+    if (!(x > -1e9 && x < 1e9)) {
+        _out_reserve(400);
+        _out_n += snprintf(_out + _out_n, 400, "%.6f\n", x);
+        return;
+    }
+    if (neg)
+        x = -x;
+
+    /* printf("%.6f") rounds the exact x * 1e6, ties to even: p + e is
+       that product with no rounding error (Dekker's product, 1e6 needs
+       no splitting), r and d its integer and fraction parts */
+    c = 134217729.0 * x;
+    hi = c - (c - x);
+    lo = x - hi;
+    p = x * 1e6;
+    e = (hi * 1e6 - p) + lo * 1e6;
+    r = (unsigned long long)p;
+    d = p - r;
+    if (d > 0.5 || (d == 0.5 && (e > 0 || (e == 0 && r & 1))))
+        r++;
+
+    _out_reserve(20);
+    if (neg)
+        _out[_out_n++] = '-';
+    _print_digits(r / 1000000);
+    _out[_out_n++] = '.';
+    frac = r % 1000000;
+    for (i = 5; i >= 0; i--) {
+        _out[_out_n + i] = '0' + frac % 10;
+        frac /= 10;
+    }
+    _out_n += 6;
+    _out[_out_n++] = '\n';
+}
+'''
+
+def struct_name(name):
+    '''the C type of the wabbit struct name, prefixed like functions'''
+    return f'Struct_{name}'
+
+def func_name(name):
+    '''
+    The C name of the wabbit function name: functions get their own
+    prefix, so main or one named like a libc builtin (sqrt, fabs, ...)
+    can't clash with C's, which clang may fold when called on constants
+    '''
+    return f'Func_{name}'
+
+class TypeVisitor(NodeVisitor):
     def __init__(self, node):
         self.env = Scopes()
         self.var_ids = {}
 
+        # struct name -> {field name: type}
+        self.structs = {}
+
         self.visit(node)
 
     def __repr__(self):
@@ -152,7 +284,7 @@ class TypeVisitor:
         name = node.__class__.__name__
         if isinstance(node, Name):
             name += '_' + node.value
-        elif hasattr(node, 'name'):
+        elif isinstance(getattr(node, 'name', None), Name):
             name += '_' + node.name.value
 
         i = self.var_ids.get(id(node))
@@ -163,8 +295,7 @@ class TypeVisitor:
 
     def visit(self, node):
         node._var = self.var(node)
-        m = getattr(self, f'visit_{node.__class__.__name__}')
-        m(node)
+        self.visit_table[node.__class__](self, node)
 #        print('VISIT', node, node._var, node._type, file=sys.stderr)
 
     @new_scope()
@@ -197,17 +328,23 @@ class TypeVisitor:
         if node.op not in ('+', '-', '*', '/'):
             node._type = 'bool'
 
+    # constants are used inline, their "variable" is the C literal
+
     def visit_Integer(self, node):
         node._type = 'int'
+        node._var = str(node.value)
 
     def visit_Float(self, node):
         node._type = 'float'
+        node._var = str(node.value)
 
     def visit_Char(self, node):
         node._type = 'char'
+        node._var = f"'{node.value}'"
 
     def visit_Bool(self, node):
         node._type = 'bool'
+        node._var = 'true' if node.value else 'false'
 
     def visit_Print(self, node):
 #        print(node, node.arg, file=sys.stderr)
@@ -249,22 +386,21 @@ class TypeVisitor:
     def visit_Assign(self, node):
         self.visit(node.arg)
 
-        if isinstance(node.name, Name):
-            # visit to populate from env
-            self.visit(node.name)
-            return
+        # visit to populate from env, or from the struct for an Attribute
+        self.visit(node.name)
+        assert node.name._type == node.arg._type, (node, node.name._type, node.arg._type)
 
-        # Attribute - recursively lookup the dict to set the value in...
-        attr = node.name
-        env = self.resolve_Attribute(attr.name)
-        env[attr.attr] = arg._type
+    def visit_Struct(self, node):
+        # structs are in the global scope, like functions
+        self.env.global_scope[node.name.value] = node
+        self.structs[node.name.value] = {f.name.value: f.type.type for f in node.fields}
 
-    def resolve_Attribute(self, node):
-        if isinstance(node, Name):
-            # we're updating an existing struct, so we don't need
-            # current_scope here - update it in whatever scope it lives in...
-            return self.env[node.value]
-        return self.resolve_Attribute(node.name)[node.attr]
+    def visit_Attribute(self, node):
+        # the field of a struct is used in place, its "variable" is the
+        # C expression for it
+        self.visit(node.name)
+        node._type = self.structs[node.name._type][node.attr]
+        node._var = f'{node.name._var}.{node.attr}'
 
     def visit_If(self, node):
         self.visit(node.cond)
@@ -295,18 +431,20 @@ class TypeVisitor:
     def visit_Call(self, node):
         func = self.env.global_scope[node.name.value]
 
-        assert isinstance(func, Func)
         if isinstance(func, Struct):
-            duh
-
-        node._type = func.ret_type.type
+            # a new struct, the args are its fields
+            node._type = func.name.value
+            types = [f.type.type for f in func.fields]
+        else:
+            assert isinstance(func, Func)
+            node._type = func.ret_type.type
+            types = [a.type.type for a in func.args]
 
         # visit args and check types
-        assert len(func.args) == len(node.args)
-        args = {}
-        for farg, arg in zip(func.args, node.args):
+        assert len(types) == len(node.args)
+        for type, arg in zip(types, node.args):
             self.visit(arg)
-            assert farg.type.type == arg._type
+            assert type == arg._type
 
     def visit_Break(self, node):
         pass
@@ -317,7 +455,109 @@ class TypeVisitor:
     def visit_Unit(self, node):
         node._type = 'unit'
 
-class CCompilerVisitor:
+class Emitter:
+    '''
+    Append-only C output: fragments are collected in a list, and written
+    to file in chunks if there is one, so the output is never copied
+    while it's built
+    '''
+    def __init__(self, file=None, chunk=4096):
+        self.file = file
+        self.chunk = chunk
+        self.parts = []
+
+    def __call__(self, s):
+        parts = self.parts
+        parts.append(s)
+        if self.file is not None and len(parts) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.write(''.join(self.parts))
+            self.parts.clear()
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+# short names for the shared temporaries, by C type
+TEMP_PREFIX = {
+    'int': '_i',
+    'double': '_f',
+    'bool': '_b',
+    'char': '_c',
+    'int*': '_u',
+}   # and _s for structs
+
+def allocate(lines, temps, loops):
+    '''
+    Give the temporaries in temps (C name -> C type) used by the lowered
+    code lines as few C variables as possible: two temporaries share one
+    if they have the same type and are never live at the same time.
+    Returns the C lines and the variables to declare, name -> C type.
+
+    A line is (format, args, loop): format.format(*args) is its C, args
+    the variables and labels it uses, and loop the innermost loop it's
+    in, an index into loops.  A loop is (head, tail, parent), the lines
+    of its label and of the goto back to it, and the loop it's in.  The
+    variable of a struct field is 'var.field', only var is looked up.
+
+    A temporary is live from the first line that uses it to the last,
+    stretched to the whole loop if it's live at the head of one and used
+    inside it, so it survives the goto back.  Loops nest, so that's the
+    outermost loop around its last use whose head is after its first.
+    Then a linear scan hands out the variables, a temporary can take one
+    whose last use is on its first line: the operands are read before
+    the result is stored.
+    '''
+    first = {}
+    last = {}
+    where = {}
+    for i, (_, args, loop) in enumerate(lines):
+        for arg in args:
+            name = arg.partition('.')[0]
+            if name in temps:
+                first.setdefault(name, i)
+                last[name] = i
+                where[name] = loop
+
+    for name, start in first.items():
+        loop = where[name]
+        while loop is not None and loops[loop][0] > start:
+            last[name] = max(last[name], loops[loop][1])
+            loop = loops[loop][2]
+
+    names = {}
+    decls = {}
+    free = {}
+    live = []
+    for name in sorted(first, key=first.get):
+        start = first[name]
+        while live and live[0][0] <= start:
+            _, var = heapq.heappop(live)
+            free[decls[var]].append(var)
+
+        type = temps[name]
+        pool = free.setdefault(type, [])
+        if pool:
+            var = pool.pop()
+        else:
+            var = f'{TEMP_PREFIX.get(type, "_s")}{len(decls)}'
+            decls[var] = type
+        names[name] = var
+        heapq.heappush(live, (last[name], var))
+
+    def rename(arg):
+        name, dot, field = arg.partition('.')
+        return names[name] + dot + field if name in names else arg
+
+    return [format.format(*map(rename, args)) if args else format for format, args, _ in lines], decls
+
+
+class CCompilerVisitor(NodeVisitor):
+    prefixes = ('visit', 'define')
+
     # wabbit -> C types
     typemap = {
         'int': 'int',
@@ -327,21 +567,41 @@ class CCompilerVisitor:
         'unit': 'int*',
     }
 
+    def __init__(self, file=None, shared=False):
+        self.out = Emitter(file)
+        self.emit = self.out
+
+        # name -> Struct node
+        self.structs = {}
+
+        # for a shared library: no C main(), the loader calls
+        # _wabbit_init() and the functions
+        self.shared = shared
+
+        # C name -> C type of the temporaries of the code being defined
+        self.temps = {}
+
+        # the lines and loops of the code being emitted, see allocate(),
+        # and the innermost loop
+        self.lines = []
+        self.loops = []
+        self.loop = None
+
+    def ctype(self, type):
+        return self.typemap.get(type) or struct_name(type)
+
     def compile_c(self, node):
+        '''
+        Emit the C program for node, returns it as a string, or None
+        if it was written to the file given to the constructor
+        '''
+        emit = self.emit
         types = TypeVisitor(node)
 
-        s = '''
-#include <stdio.h>
-#include <stdbool.h>
-
-int *Unit() {
-    static int instance = 42;
-    return &instance;
-}
-'''
+        emit(RUNTIME)
 
         # global vars / functions
-        s += '// global variables\n'
+        emit('// global variables\n')
 
         main = None
         for n in node.statements:
@@ -349,316 +609,461 @@ int *Unit() {
             if isinstance(n, Func) and n.name.value == 'main':
                 assert main is None
                 main = n
-                n.name.value = '_main'  # hack, rename wabbit main
-
-            s += self.define(n)
 
-        s += '\nvoid _wabbit_init() {\n'
+            self.define(n)
 
-        for n in node.statements:
-            s += self.visit(n)
-
-        s += '}\n\n'
+        emit('\nvoid _wabbit_init() {\n')
+        self.emit_code(node.statements)
+        emit('}\n\n')
 
-        s += f'''int main() {{
+        if not self.shared:
+            emit(f'''int main() {{
+atexit(_wabbit_flush);
 _wabbit_init();
-{'_main();' if main else ''}
+{func_name('main') + '();' if main else ''}
 return 0;
 }}
-'''
-
-        return s
-
-    def visit(self, node):
-        m = getattr(self, f'visit_{node.__class__.__name__}')
-        return m(node)
+''')
+
+        if self.out.file is not None:
+            self.out.flush()
+            return None
+        return self.out.getvalue()
+
+    def emit_code(self, nodes):
+        '''
+        Emit the code of nodes, after the declarations of its temporaries,
+        which allocate() packs into as few C variables as it can
+        '''
+        emit = self.emit
+        self.lines = lines = []
+        self.loops = []
+        self.loop = None
+        self.emit = self.code
+        try:
+            for n in nodes:
+                self.visit(n)
+        finally:
+            self.emit = emit
+
+        lines, decls = allocate(lines, self.temps, self.loops)
+        for var, type in decls.items():
+            emit(f'{type} {var};\n')
+        for line in lines:
+            emit(line)
+
+    def code(self, format, *args):
+        '''
+        Add a line of code: format.format(*args), with the variables and
+        labels it uses in args, see allocate()
+        '''
+        self.lines.append((format, args, self.loop))
 
     def visit_Block(self, node):
-        s = ''
         for n in node.statements:
-            s += self.visit(n)
-        return s
+            self.visit(n)
 
     def visit_Compound(self, node):
-        s = ''
         for n in node.statements:
-            s += self.visit(n)
+            self.visit(n)
 
         # assign the last statement as the return value
         if n._type:
-            s += f'{node._var} = {n._var};\n'
-
-        return s
+            self.emit('{} = {};\n', node._var, n._var)
 
     def visit_UnaOp(self, node):
-        s = self.visit(node.arg)
-        return s + f'{node._var} = {node.op}{node.arg._var};\n'
+        self.visit(node.arg)
+        self.emit('{} = %s{};\n' % node.op, node._var, node.arg._var)
 
     def visit_BinOp(self, node):
-        s = self.visit(node.left)
+        emit = self.emit
+        self.visit(node.left)
 
         # shortcircuit ops
         if node.op in ('&&', '||'):
             invert = '!' if node.op == '&&' else ''
-            s += f'{node._var} = {node.left._var};\n'
-            s += f'if ({invert}{node._var}) goto {node._var}_End;\n'
-            s += self.visit(node.right)
-            s += f'{node._var} = {node.right._var};\n'
-            s += f'{node._var}_End:\n'
-            s += NOOP
+            end = f'{node._var}_End'
+            emit('{} = {};\n', node._var, node.left._var)
+            emit('if (%s{}) goto {};\n' % invert, node._var, end)
+            self.visit(node.right)
+            emit('{} = {};\n', node._var, node.right._var)
+            emit('{}:\n', end)
+            emit(NOOP)
         else:
-            s += self.visit(node.right)
-            s += f'{node._var} = {node.left._var} {node.op} {node.right._var};\n'
+            self.visit(node.right)
+            emit('{} = {} %s {};\n' % node.op, node._var, node.left._var, node.right._var)
 
-        return s
+    # constants are inline, see TypeVisitor
 
     def visit_Integer(self, node):
-        return f'{node._var} = {node.value};\n';
+        pass
 
     def visit_Float(self, node):
-        return f'{node._var} = {node.value};\n';
+        pass
 
     def visit_Char(self, node):
-        return f'''{node._var} = '{node.value}';\n''';
+        pass
 
     def visit_Bool(self, node):
-        return f'{node._var} = {"true" if node.value else "false"};\n';
+        pass
 
     def visit_Var(self, node):
         if node.arg is None:
-            return ''
-        s = self.visit(node.arg)
-        return s + f'{node.name._var} = {node.arg._var};\n';
+            return
+        self.visit(node.arg)
+        self.emit('{} = {};\n', node.name._var, node.arg._var)
 
     def visit_Const(self, node):
-        s = self.visit(node.arg)
-        return s + f'{node.name._var} = {node.arg._var};\n';
+        self.visit(node.arg)
+        self.emit('{} = {};\n', node.name._var, node.arg._var)
 
     def visit_Print(self, node):
-        s = self.visit(node.arg)
-
-        if node.arg._type == 'bool':
-            s += f'printf({node.arg._var} ? "true\\n": "false\\n");\n'
-            return s
+        self.visit(node.arg)
 
         if node.arg._type == 'unit':
-            s += f'printf("()\\n");\n'
-            return s
-
-        format = {
-            'int': '%d',
-            'float': '%.6f',  # we emit double
-            'char': '%c',
-        }[node.arg._type]
-
-        nl = ''
-        if node.arg._type in ('int', 'float'):
-            nl = '\\n'
-
-        s += f'printf("{format}{nl}", {node.arg._var});\n'
+            self.emit('_print_str("()\\n");\n')
+            return
 
-        return s
+        # see RUNTIME
+        self.emit('_print_%s({});\n' % node.arg._type, node.arg._var)
 
     def visit_Assign(self, node):
         # would have been defined via var/const
-        s = self.visit(node.arg)
-        return s + f'{node.name._var} = {node.arg._var};\n';
+        self.visit(node.arg)
+        self.emit('{} = {};\n', node.name._var, node.arg._var)
 
     def visit_Name(self, node):
-        return ''
+        pass
 
     def visit_Func(self, node):
-        return ''
+        pass
 
     def visit_If(self, node):
-        s =  self.visit(node.cond)
-        s += f'if ({node.cond._var}) goto {node._var}_block;\n'
-        if node.eblock:
-            s += f'goto {node._var}_eblock;\n'
-        else:
-            s += f'goto {node._var}_End;\n'
-        s += f'{node._var}_block:\n'
-        s += self.visit(node.block)
-        s += f'goto {node._var}_End;\n'
+        emit = self.emit
+        block, eblock, end = f'{node._var}_block', f'{node._var}_eblock', f'{node._var}_End'
+        self.visit(node.cond)
+        emit('if ({}) goto {};\n', node.cond._var, block)
+        emit('goto {};\n', eblock if node.eblock else end)
+        emit('{}:\n', block)
+        self.visit(node.block)
+        emit('goto {};\n', end)
         if node.eblock:
-            s += f'{node._var}_eblock:\n'
-            s += self.visit(node.eblock)
-        s += f'{node._var}_End:\n'
-        s += NOOP
-        return s
+            emit('{}:\n', eblock)
+            self.visit(node.eblock)
+        emit('{}:\n', end)
+        emit(NOOP)
 
     def visit_While(self, node):
+        emit = self.emit
         self.current_while = node
-        s = f'{node._var}:\n'
-        s +=  self.visit(node.cond)
-        s += f'if ({node.cond._var}) goto {node._var}_Start;\n'
-        s += f'goto {node._var}_End;\n'
-        s += f'{node._var}_Start:\n'
-        s += self.visit(node.block)
-        s += f'goto {node._var};\n'
-        s += f'{node._var}_End:\n'
-        s += NOOP
+        start, end = f'{node._var}_Start', f'{node._var}_End'
+
+        # the lines from the label to the goto back are the loop
+        loop = len(self.loops)
+        self.loops.append((len(self.lines), None, self.loop))
+        self.loop = loop
+        emit('{}:\n', node._var)
+        self.visit(node.cond)
+        emit('if ({}) goto {};\n', node.cond._var, start)
+        emit('goto {};\n', end)
+        emit('{}:\n', start)
+        self.visit(node.block)
+        emit('goto {};\n', node._var)
+        head, _, parent = self.loops[loop]
+        self.loops[loop] = (head, len(self.lines) - 1, parent)
+        self.loop = parent
+
+        emit('{}:\n', end)
+        emit(NOOP)
         self.current_while = None
-        return s
 
     def visit_Return(self, node):
-        s = self.visit(node.value)
-        return s + f'return {node.value._var};\n'
+        self.visit(node.value)
+        self.emit('return {};\n', node.value._var)
 
     def visit_Call(self, node):
-        s = ''
         for n in node.args:
-            s += self.visit(n)
+            self.visit(n)
+
+        struct = self.structs.get(node.name.value)
+        if struct:
+            # a new struct, set its fields
+            for field, arg in zip(struct.fields, node.args):
+                self.emit('{}.%s = {};\n' % field.name.value, node._var, arg._var)
+            return
 
-        args = ', '.join(n._var for n in node.args)
+        args = ', '.join('{}' for n in node.args)
 
-    
         # if node._type:  - some code assigns from functions which return unit...
-        s += f'{node._var} = '
+        self.emit('{} = %s(%s);\n' % (func_name(node.name.value), args), node._var, *[n._var for n in node.args])
 
-        return s + f'{node.name.value}({args});\n'
+    def visit_Struct(self, node):
+        pass
+
+    def visit_Attribute(self, node):
+        # used in place, see TypeVisitor
+        pass
 
     def visit_Break(self, node):
         assert self.current_while
-        return f'goto {self.current_while._var}_End;\n'
+        self.emit('goto {};\n', f'{self.current_while._var}_End')
 
     def visit_Continue(self, node):
         assert self.current_while
-        return f'goto {self.current_while._var};\n'
+        self.emit('goto {};\n', self.current_while._var)
 
     def visit_Unit(self, node):
-        return f'Unit();\n'
+        self.emit('Unit();\n')
 
     #### definitions
 
     def define(self, node):
-        m = getattr(self, f'define_{node.__class__.__name__}')
-        return m(node)
-    
+        return self.define_table[node.__class__](self, node)
+
     def define_Node(self, node):
-        return f'{self.typemap[node._type]} {node._var};\n';
+        # a temporary, declared by emit_code()
+        self.temps[node._var] = self.ctype(node._type)
 
     def define_Integer(self, node):
-        return self.define_Node(node)
-    
+        pass
+
     def define_Float(self, node):
-        return self.define_Node(node)
-    
+        pass
+
     def define_Char(self, node):
-        return self.define_Node(node)
-    
+        pass
+
     def define_Bool(self, node):
-        return self.define_Node(node)
-    
+        pass
+
     def define_Name(self, node):
-        return ''
-#        return self.define_Node(node)
+        pass
+
+    def declare(self, name):
+        # a named variable, declared where it's defined
+        self.emit(f'{self.ctype(name._type)} {name._var};\n')
 
     def define_Var(self, node):
-        s = self.define_Node(node.name)
+        self.declare(node.name)
         if node.arg:
-            s += self.define(node.arg)
-        return s
+            self.define(node.arg)
 
     def define_Const(self, node):
-        s = self.define_Node(node.name)
-        return s + self.define(node.arg)
+        self.declare(node.name)
+        self.define(node.arg)
 
     def define_Assign(self, node):
-        s = self.define(node.arg)
-        return s
+        self.define(node.arg)
 
     def define_UnaOp(self, node):
-        s = self.define_Node(node)
-        return s + self.define(node.arg)
+        self.define_Node(node)
+        self.define(node.arg)
 
     def define_BinOp(self, node):
-        s = self.define(node.left)
-        s += self.define(node.right)
-        return s + self.define_Node(node)
+        self.define(node.left)
+        self.define(node.right)
+        self.define_Node(node)
 
     def define_Block(self, node):
-        s = ''
         for n in node.statements:
-            s += self.define(n)
-        return s
-            
+            self.define(n)
+
     def define_Compound(self, node):
-        s = self.define_Node(node)
-        return s + self.define_Block(node)
+        self.define_Node(node)
+        self.define_Block(node)
 
     def define_Func(self, node):
-        args = ', '.join(f'{self.typemap[n.type.type]} {n.name._var}' for n in node.args)
-        s = f'\n{self.typemap[node.ret_type.type]} {node.name.value}({args}) {{\n'
-        s += self.define(node.block)
-        s += self.visit(node.block)
+        args = ', '.join(f'{self.ctype(n.type.type)} {n.name._var}' for n in node.args)
+        self.emit(f'\n{self.ctype(node.ret_type.type)} {func_name(node.name.value)}({args}) {{\n')
+        temps, self.temps = self.temps, {}
+        self.define(node.block)
+        self.emit_code([node.block])
+        self.temps = temps
         if node.ret_type.type == 'unit':
-            s += 'return Unit();\n'
-        s += '}\n\n'
-        return s
+            self.emit('return Unit();\n')
+        self.emit('}\n\n')
 
     def define_Print(self, node):
-        return self.define(node.arg)
+        self.define(node.arg)
 
     def define_Return(self, node):
-        return self.define(node.value)
+        self.define(node.value)
 
     def define_If(self, node):
-        s = self.define(node.cond)
-        s += self.define(node.block)
+        self.define(node.cond)
+        self.define(node.block)
         if node.eblock:
-            s += self.define(node.eblock)
-        return s
+            self.define(node.eblock)
 
     def define_While(self, node):
-        s = self.define(node.cond)
-        s += self.define(node.block)
-        return s
+        self.define(node.cond)
+        self.define(node.block)
 
     def define_Call(self, node):
-        s = f'{self.typemap[node._type]} {node._var};\n'
+        self.define_Node(node)
         for arg in node.args:
-            s += self.define(arg)
-        return s
+            self.define(arg)
+
+    def define_Struct(self, node):
+        self.structs[node.name.value] = node
+        fields = ''.join(f'{self.ctype(f.type.type)} {f.name.value};\n' for f in node.fields)
+        self.emit(f'\ntypedef struct {{\n{fields}}} {struct_name(node.name.value)};\n')
+
+    def define_Attribute(self, node):
+        pass
 
     def define_Break(self, node):
-        return ''
+        pass
 
     def define_Continue(self, node):
-        return ''
+        pass
 
     def define_Unit(self, node):
-        return self.define_Node(node)
+        self.define_Node(node)
 
 
-def compile_c(text_or_node):
+def compile_c(text_or_node, file=None, shared=False):
+    '''
+    The C program for text_or_node, or None if file is given: then it's
+    written to file as it's generated.  shared leaves out main(), for
+    a shared library.
+    '''
     node = text_or_node
     if not isinstance(text_or_node, Node):
         node = parse(text_or_node)
-    return CCompilerVisitor().compile_c(node)
-
-def cc(text_or_node, filename):
-    code = compile_c(text_or_node)
+    return CCompilerVisitor(file, shared).compile_c(node)
+
+def cc(text_or_node, filename, profile=None, native=False, train=(), flags=()):
+    '''
+    Write the C program for text_or_node to filename, and build it into
+    the executable next to it, with the compiler's defaults or one of the
+    build profiles, then flags, see wabbit.build
+    '''
     with open(filename, 'w') as f:
-        f.write(code)
-    ret = os.system(f'clang {filename} -o {filename.replace(".c", "")}')
-    assert ret == 0, ret
+        compile_c(text_or_node, f)
+    build_profile(filename, filename.replace('.c', ''), profile, native, train, flags)
+
+
+class Library:
+    '''
+    A wabbit program built as a shared library and loaded in this
+    process.  Loading runs its top level statements, then its functions
+    are attributes of funcs, called with python values:
+
+        lib = load(text)
+        lib.funcs.fib(20)
+
+    Arguments and results are converted following the Func signatures:
+    int, float and bool as python ones, char as a 1 character str, unit
+    as None.  Structs are ctypes Structures, attributes of structs:
+
+        lib.funcs.add(lib.structs.Complex(1.0, 2.0), c).real
+
+    print's output is buffered apart from python's, it's
+    written to stdout by flush() and at exit.
+    '''
+    ctypes_map = {
+        'int': ctypes.c_int,
+        'float': ctypes.c_double,
+        'bool': ctypes.c_bool,
+        'char': ctypes.c_char,
+        'unit': ctypes.c_void_p,
+    }
+
+    def __init__(self, filename, funcs, structs=()):
+        self.dll = ctypes.CDLL(filename)
+
+        self.structs = SimpleNamespace()
+        for struct in structs:
+            fields = [(f.name.value, self.ctype(f.type.type)) for f in struct.fields]
+            setattr(self.structs, struct.name.value, type(struct.name.value, (ctypes.Structure,), {'_fields_': fields}))
+
+        self.funcs = SimpleNamespace()
+        for func in funcs:
+            f = getattr(self.dll, func_name(func.name.value))
+            types = [n.type.type for n in func.args]
+            f.argtypes = [self.ctype(_) for _ in types]
+            f.restype = None if func.ret_type.type == 'unit' else self.ctype(func.ret_type.type)
+            if 'char' in types or func.ret_type.type == 'char':
+                f = self.char_wrapper(f, types, func.ret_type.type)
+            setattr(self.funcs, func.name.value, f)
+        self.dll._wabbit_init()
+        atexit.register(self.flush)
+
+    def ctype(self, type):
+        return getattr(self.structs, type, None) or self.ctypes_map[type]
+
+    @staticmethod
+    def char_wrapper(f, types, ret_type):
+        # ctypes wants bytes for char
+        def wrapper(*args):
+            args = [_.encode('latin1') if t == 'char' else _ for t, _ in zip(types, args)]
+            ret = f(*args)
+            return ret.decode('latin1') if ret_type == 'char' else ret
+        return wrapper
+
+    def flush(self):
+        '''write out print's output'''
+        self.dll._wabbit_flush()
+        ctypes.CDLL(None).fflush(None)
+
+# program hash -> Library, and the directory of their files
+_libraries = {}
+_library_dir = None
+
+def load(text_or_node, profile='release', native=False):
+    '''
+    The Library of the wabbit program text_or_node, built with one of the
+    build profiles (not pgo, a library can't be run to train it).  It's
+    built and loaded once per process for the same program.
+    '''
+    global _library_dir
+
+    if profile == 'pgo':
+        raise ValueError("a library can't be built with profile 'pgo'")
+
+    # source text is looked up as is, before it's even parsed
+    source_key = None
+    if isinstance(text_or_node, str):
+        source_key = hashlib.sha256(f'{profile} {native}\n{text_or_node}'.encode()).hexdigest()
+        lib = _libraries.get(source_key)
+        if lib is not None:
+            return lib
+
+    node = text_or_node
+    if not isinstance(text_or_node, Node):
+        node = parse(text_or_node)
+    code = compile_c(node, shared=True)
+    key = hashlib.sha256(f'{profile} {native}\n{code}'.encode()).hexdigest()
+
+    lib = _libraries.get(key)
+    if lib is None:
+        if _library_dir is None:
+            _library_dir = tempfile.mkdtemp(prefix='wabbit-')
+            atexit.register(shutil.rmtree, _library_dir, True)
+
+        filename = os.path.join(_library_dir, key)
+        with open(filename + '.c', 'w') as f:
+            f.write(code)
+        build_profile(filename + '.c', filename + '.so', profile, native, flags=['-shared', '-fPIC'])
+        funcs = [n for n in node.statements if isinstance(n, Func)]
+        structs = [n for n in node.statements if isinstance(n, Struct)]
+        lib = _libraries[key] = Library(filename + '.so', funcs, structs)
+    if source_key is not None:
+        _libraries[source_key] = lib
+    return lib
 
 def main(args):
     if args:
         if os.path.isfile(args[0]):
-            with open(args[0]) as file:
-                text = file.read()
-
-            output = compile_c(text)
             with open(args[0] + '.c', 'w') as f:
-                f.write(output)
+                compile_c(pathlib.Path(args[0]), f)
         else:
-            text = args[0]
-            print(compile_c(text))
+            compile_c(args[0], sys.stdout)
+            print()
     else:
-        text = sys.stdin.read()
-        print(compile_c(text))
+        compile_c(sys.stdin.read(), sys.stdout)
+        print()
 
 if __name__ == '__main__':
     main(sys.argv[1:])
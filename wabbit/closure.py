@@ -0,0 +1,319 @@
+# closure.py
+#
+# A faster execution engine for Wabbit programs.  The Interpreter in
+# interp.py walks the model every time a node is executed - looking up
+# the visit_* method by name, rebuilding operator tables, etc.  Here we
+# walk the model exactly once and turn every node into a small Python
+# closure that does only the work specific to that node.  Running the
+# program is then just calling the closure for the top-level block.
+#
+# Every closure takes the current frame (see resolve.py) as its only
+# argument.  The semantics (scoping, output, return values) are the same
+# as the Interpreter, so the two engines can be swapped freely:
+#
+#     python3 -m wabbit.interp --engine closure tests/Func/fib.wb
+
+from .model import *
+from .interp import BREAK, CONTINUE, RETURN, Signal, UNDEFINED, global_scope, types
+from .resolve import resolve
+from .visitor import NodeVisitor
+
+# each entry takes the compiled operand closures and returns a closure
+# performing the operation - one specialized closure per operator
+_binops = {
+    '+': lambda l, r: lambda f: l(f) + r(f),
+    '-': lambda l, r: lambda f: l(f) - r(f),
+    '*': lambda l, r: lambda f: l(f) * r(f),
+    '<': lambda l, r: lambda f: l(f) < r(f),
+    '>': lambda l, r: lambda f: l(f) > r(f),
+    '<=': lambda l, r: lambda f: l(f) <= r(f),
+    '>=': lambda l, r: lambda f: l(f) >= r(f),
+    '!=': lambda l, r: lambda f: l(f) != r(f),
+    '==': lambda l, r: lambda f: l(f) == r(f),
+    # short-circuit eval
+    '&&': lambda l, r: lambda f: l(f) and r(f),
+    '||': lambda l, r: lambda f: l(f) or r(f),
+}
+
+def can_signal(node):
+    '''True if executing node can return a break/continue/return Signal'''
+    if isinstance(node, (Break, Continue, Return)):
+        return True
+    if isinstance(node, If):
+        return can_signal(node.block) or (node.eblock is not None and can_signal(node.eblock))
+    if isinstance(node, While):
+        # break/continue are handled by the loop itself
+        return any(isinstance(_, Return) for _ in walk(node.block))
+    if isinstance(node, (Block, Compound)):
+        return any(can_signal(_) for _ in node.statements)
+    return False
+
+def walk(node):
+    '''all the nodes in the tree under node'''
+    yield node
+    for value in fields(node).values():
+        for n in (value if isinstance(value, list) else [value]):
+            if isinstance(n, Node):
+                yield from walk(n)
+
+_unaops = {
+    '-': lambda a: lambda f: -a(f),
+    '+': lambda a: a,
+    '!': lambda a: lambda f: not a(f),
+}
+
+
+class ClosureCompiler(NodeVisitor):
+    prefixes = ('compile',)
+
+    def __init__(self, globals, stdout):
+        self.globals = globals
+        self.stdout = stdout
+
+        # python callable taking the evaluated call arguments, by global
+        # slot - filled in as Func/Struct nodes are compiled
+        self.callables = [None] * len(globals)
+
+    def compile(self, node):
+        assert node is not None
+        return self.compile_table[node.__class__](self, node)
+
+    def compile_statements(self, statements):
+        return tuple(self.compile(n) for n in statements)
+
+    def compile_Name(self, node):
+        slot = node._slot
+        if slot >= 0:
+            return lambda f: f[slot]
+
+        G = self.globals
+        slot = ~slot
+        return lambda f: G[slot]
+
+    def compile_store(self, node, value):
+        # closure storing the result of value into the Name node
+        slot = node._slot
+        if slot >= 0:
+            def store(f):
+                f[slot] = value(f)
+            return store
+
+        G = self.globals
+        slot = ~slot
+
+        def store_global(f):
+            G[slot] = value(f)
+        return store_global
+
+    def compile_Integer(self, node):
+        value = node.value
+        return lambda f: value
+
+    compile_Float = compile_Integer
+    compile_Bool = compile_Integer
+
+    def compile_Unit(self, node):
+        return lambda f: node
+
+    def compile_Char(self, node):
+        # only during execution, return the unescaped char
+        value = node.unescape()
+        return lambda f: value
+
+    def compile_BinOp(self, node):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+
+        if node.op == '/':
+            def div(f):
+                a = left(f)
+                b = right(f)
+                if isinstance(a, int):
+                    # integer division
+                    return a // b
+                return a / b
+            return div
+
+        return _binops[node.op](left, right)
+
+    def compile_UnaOp(self, node):
+        return _unaops[node.op](self.compile(node.arg))
+
+    def compile_Block(self, node):
+        statements = self.compile_statements(node.statements)
+
+        if not can_signal(node):
+            def block(f):
+                for stmt in statements:
+                    stmt(f)
+            return block
+
+        def block_signal(f):
+            for stmt in statements:
+                r = stmt(f)
+                if r.__class__ is Signal:
+                    return r
+        return block_signal
+
+    def compile_Compound(self, node):
+        statements = self.compile_statements(node.statements)
+
+        def compound(f):
+            ret = None
+            for stmt in statements:
+                ret = stmt(f)
+                if ret.__class__ is Signal:
+                    break
+            return ret
+        return compound
+
+    def compile_Print(self, node):
+        append = self.stdout.append
+        arg = self.compile(node.arg)
+
+        def print_(f):
+            append(arg(f))
+        return print_
+
+    def compile_Const(self, node):
+        return self.compile_store(node.name, self.compile(node.arg))
+
+    def compile_Var(self, node):
+        if node.arg is not None:
+            arg = self.compile(node.arg)
+        else:
+            # default value for the declared type
+            typ = types[node.type.type]
+            arg = lambda f: typ()
+
+        return self.compile_store(node.name, arg)
+
+    def compile_Assign(self, node):
+        arg = self.compile(node.arg)
+
+        if isinstance(node.name, Name):
+            return self.compile_store(node.name, arg)
+
+        # Attribute - resolve the dict holding the field, then set it
+        target = self.compile(node.name.name)
+        attr = node.name.attr
+
+        def assign_attribute(f):
+            value = arg(f)
+            target(f)[attr] = value
+        return assign_attribute
+
+    def compile_If(self, node):
+        cond = self.compile(node.cond)
+        block = self.compile(node.block)
+        eblock = self.compile(node.eblock) if node.eblock is not None else None
+
+        if eblock is None:
+            def if_(f):
+                if cond(f):
+                    return block(f)
+            return if_
+
+        def if_else(f):
+            if cond(f):
+                return block(f)
+            return eblock(f)
+        return if_else
+
+    def compile_While(self, node):
+        cond = self.compile(node.cond)
+        block = self.compile(node.block)
+
+        if not can_signal(node.block):
+            def while_(f):
+                while cond(f):
+                    block(f)
+            return while_
+
+        def while_signal(f):
+            while cond(f):
+                r = block(f)
+                if r.__class__ is Signal:
+                    if r is BREAK:
+                        break
+                    if r is not CONTINUE:
+                        # return
+                        return r
+        return while_signal
+
+    def compile_Func(self, node):
+        statements = self.compile_statements(node.block.statements)
+        extra = [None] * (node._nslots - len(node.args))
+
+        def call(*args):
+            frame = [*args, *extra]
+            for stmt in statements:
+                r = stmt(frame)
+                if r.__class__ is Signal:
+                    return r[1]
+
+        self.callables[~node.name._slot] = call
+
+        # just store the function node into the global scope, calls are
+        # dispatched through self.callables
+        return self.compile_store(node.name, lambda f: node)
+
+    def compile_Return(self, node):
+        value = self.compile(node.value)
+
+        return lambda f: (RETURN, value(f))
+
+    def compile_Continue(self, node):
+        return lambda f: CONTINUE
+
+    def compile_Break(self, node):
+        return lambda f: BREAK
+
+    def compile_Call(self, node):
+        callables = self.callables
+        slot = ~node.name._slot
+        args = self.compile_statements(node.args)
+
+        def call(f):
+            return callables[slot](*[arg(f) for arg in args])
+        return call
+
+    def compile_Struct(self, node):
+        fields = tuple(_.name.value for _ in node.fields)
+        self.callables[~node.name._slot] = lambda *args: dict(zip(fields, args))
+        return self.compile_store(node.name, lambda f: node)
+
+    def compile_Attribute(self, node):
+        obj = self.compile(node.name)
+        attr = node.attr
+
+        def attribute(f):
+            o = obj(f)
+            if isinstance(o, dict):
+                return o[attr]
+            return getattr(o, attr)
+        return attribute
+
+
+class ClosureInterpreter:
+    '''
+    Drop-in replacement for Interpreter, compiles the model to closures
+    before running it
+    '''
+    def __init__(self, stdout=None):
+        self.names = []
+        self.globals = []
+        self.stdout = stdout if stdout is not None else []
+
+    def interpret(self, node):
+        self.names = resolve(node)
+        self.globals = [UNDEFINED] * len(self.names)
+
+        compiler = ClosureCompiler(self.globals, self.stdout)
+        ret = compiler.compile(node)([None] * node._nslots)
+
+        main = global_scope(self.names, self.globals).get('main')
+        if isinstance(main, Func):
+            ret = compiler.callables[self.names.index('main')]()
+
+        return ret, global_scope(self.names, self.globals), self.stdout
@@ -0,0 +1,357 @@
+# fastparse.py
+#
+# Hand-written parser for Wabbit, builds exactly the same model as
+# WabbitParser in parse.py, just faster.  sly's LR driver does table
+# lookups and calls a production function for every reduction; here
+# statements are parsed by recursive descent and expressions by
+# precedence climbing, with the levels taken from
+# WabbitParser.precedence:
+#
+#     ||  <  &&  <  < <= > >= == !=  <  + -  <  * /  <  unary + - !
+#
+# All binary operators are left associative.
+#
+# The grammar is the one in parse.py, where statements and expressions
+# are all just 'node'.  Any node can be followed by extra semicolons,
+# which are skipped.  The one difference is that a statement always
+# ends a statement: WabbitParser reads
+#
+#     print 1; -x;
+#
+# as Print(BinOp(-, 1, x)), because of the ambiguity of the 'node SEMI'
+# rule, here it's Print(1) followed by UnaOp(-, x).
+#
+# Use it through parse():
+#
+#     parse(text, parser='fast')
+#
+# --check parses a file with both parsers, and fails if the models
+# differ:
+#
+#     python3 -m wabbit.fastparse --check file.wb
+
+import os.path
+import pathlib
+import sys
+from array import array
+
+from .model import *
+from .parse import WabbitParser
+from .tokenize import TokenBuffer, TYPE, TYPES, WabbitLexer
+
+# token kinds, as in TokenBuffer.kinds
+END = len(TYPES)
+NAME = TYPE['NAME']
+DOT = TYPE['DOT']
+COMMA = TYPE['COMMA']
+SEMI = TYPE['SEMI']
+ASSIGN = TYPE['ASSIGN']
+LPAREN = TYPE['LPAREN']
+RPAREN = TYPE['RPAREN']
+LBRACE = TYPE['LBRACE']
+RBRACE = TYPE['RBRACE']
+ELSE = TYPE['ELSE']
+
+
+def binop_precedence():
+    '''token kind -> precedence level of the binary operators'''
+    levels = {}
+    for level, (assoc, *terms) in enumerate(WabbitParser.precedence, start=1):
+        for term in terms:
+            if term in WabbitLexer._binop:
+                assert assoc == 'left', (term, assoc)
+                levels[TYPE[term]] = level
+    return levels
+
+BINOP = binop_precedence()
+UNARY = max(BINOP.values()) + 1
+UNAOP = {TYPE[_] for _ in WabbitLexer._unaop}
+
+# nodes that end a statement, at the start of a statement they aren't
+# the left operand of a binary operator
+STATEMENTS = {Print, Var, Const, Assign, Return, If, While, Func, Struct, Compound}
+
+def continues(node, kind):
+    '''
+    Could the top-level statement node go on with a token of kind?  If
+    not, whatever follows is parsed the same without it.
+    '''
+    if node.__class__ in STATEMENTS:
+        return False
+    return kind in BINOP or kind in (LPAREN, ASSIGN, DOT)
+
+
+class FastParser:
+    '''Parser for the tokens in a TokenBuffer'''
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.value = buffer.value
+        self.kinds = buffer.kinds + array('B', [END])
+        self.pos = 0
+
+        # token kind -> bound primary_* method
+        self.primaries = {
+            TYPE[name[8:]]: getattr(self, name)
+            for name in dir(self) if name.startswith('primary_')
+        }
+
+    def error(self, msg=None):
+        if self.pos < len(self.buffer):
+            lineno = self.buffer.lineno(self.pos)
+            raise SyntaxError(f'{lineno}: {msg or "Syntax error"} at {self.value(self.pos)!r}')
+        raise SyntaxError(f'{msg or "Syntax error"} at end of input')
+
+    def expect(self, kind):
+        if self.kinds[self.pos] != kind:
+            self.error(f'Expected {TYPES[kind]}')
+        self.pos += 1
+        return self.value(self.pos - 1)
+
+    def accept(self, kind):
+        if self.kinds[self.pos] == kind:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        block = self.block(END)
+        return block
+
+    def items(self):
+        '''the top-level statements, as (index of their first token, node)'''
+        items = []
+        kinds = self.kinds
+        while True:
+            while kinds[self.pos] == SEMI:
+                self.pos += 1
+            if kinds[self.pos] == END:
+                return items
+            items.append((self.pos, self.statement()))
+
+    def block(self, end):
+        statements = []
+        kinds = self.kinds
+        while True:
+            while kinds[self.pos] == SEMI:
+                self.pos += 1
+            if kinds[self.pos] == end:
+                return Block(statements)
+            statements.append(self.statement())
+
+    def statement(self):
+        node = self.primary()
+        if node.__class__ in STATEMENTS:
+            return node
+        return self.binops(node, 1)
+
+    # expressions
+
+    def node(self, level=1):
+        return self.binops(self.primary(), level)
+
+    def binops(self, left, level):
+        kinds = self.kinds
+        while True:
+            prec = BINOP.get(kinds[self.pos])
+            if prec is None or prec < level:
+                return left
+            value = self.value(self.pos)
+            self.pos += 1
+            left = BinOp(value, left, self.node(prec + 1))
+
+    def primary(self):
+        # the primary_* methods get the index of their token
+        kind = self.kinds[self.pos]
+        m = self.primaries.get(kind)
+        if m is None:
+            if kind in UNAOP:
+                value = self.value(self.pos)
+                self.pos += 1
+                return UnaOp(value, self.node(UNARY))
+            self.error()
+        self.pos += 1
+        return m(self.pos - 1)
+
+    def primary_INTEGER(self, i):
+        return Integer(int(self.value(i)))
+
+    def primary_FLOAT(self, i):
+        return Float(float(self.value(i)))
+
+    def primary_CHAR(self, i):
+        return Char(self.value(i))
+
+    def primary_TRUE(self, i):
+        return Bool(True)
+
+    def primary_FALSE(self, i):
+        return Bool(False)
+
+    def primary_BREAK(self, i):
+        return Break()
+
+    def primary_CONTINUE(self, i):
+        return Continue()
+
+    def primary_LPAREN(self, i):
+        if self.accept(RPAREN):
+            return UNIT
+        node = self.node()
+        while self.accept(SEMI):
+            pass
+        self.expect(RPAREN)
+        return node
+
+    def primary_LBRACE(self, i):
+        block = self.block(RBRACE)
+        self.pos += 1
+        return Compound(block.statements)
+
+    def primary_NAME(self, i):
+        self.pos -= 1
+        name = self.name()
+
+        kind = self.kinds[self.pos]
+        if kind == LPAREN:
+            self.pos += 1
+            args = None
+            if self.kinds[self.pos] != RPAREN:
+                args = self.callargs()
+            self.expect(RPAREN)
+            return Call(name, args)
+
+        if kind == ASSIGN:
+            self.pos += 1
+            arg = self.node()
+            self.expect(SEMI)
+            return Assign(name, arg)
+
+        return name
+
+    # statements
+
+    def primary_PRINT(self, i):
+        arg = self.node()
+        self.expect(SEMI)
+        return Print(arg)
+
+    def primary_VAR(self, i):
+        name = self.name()
+        type = None
+        if self.kinds[self.pos] == NAME:
+            type = self.type()
+            if self.accept(SEMI):
+                return Var(name, type=type)
+        self.expect(ASSIGN)
+        arg = self.node()
+        self.expect(SEMI)
+        return Var(name, arg, type)
+
+    def primary_CONST(self, i):
+        name = self.name()
+        type = None
+        if self.kinds[self.pos] == NAME:
+            type = self.type()
+        self.expect(ASSIGN)
+        arg = self.node()
+        self.expect(SEMI)
+        return Const(name, arg, type=type)
+
+    def primary_IF(self, i):
+        cond = self.node()
+        self.expect(LBRACE)
+        block = self.block(RBRACE)
+        self.pos += 1
+        eblock = None
+        if self.accept(ELSE):
+            self.expect(LBRACE)
+            eblock = self.block(RBRACE)
+            self.pos += 1
+        return If(cond, block, eblock)
+
+    def primary_WHILE(self, i):
+        cond = self.node()
+        self.expect(LBRACE)
+        block = self.block(RBRACE)
+        self.pos += 1
+        return While(cond, block)
+
+    def primary_FUNC(self, i):
+        name = self.name()
+        self.expect(LPAREN)
+        args = None
+        if self.kinds[self.pos] != RPAREN:
+            args = [self.argdef()]
+            while self.accept(COMMA):
+                args.append(self.argdef())
+        self.expect(RPAREN)
+        ret_type = None
+        if self.kinds[self.pos] == NAME:
+            ret_type = self.type()
+        self.expect(LBRACE)
+        block = self.block(RBRACE)
+        self.pos += 1
+        return Func(name, block, args, ret_type)
+
+    def primary_RETURN(self, i):
+        value = self.node()
+        self.expect(SEMI)
+        return Return(value)
+
+    def primary_STRUCT(self, i):
+        name = Name(self.expect(NAME))
+        self.expect(LBRACE)
+        fields = []
+        while True:
+            fields.append(Field(self.name(), self.type()))
+            self.expect(SEMI)
+            if self.accept(RBRACE):
+                return Struct(name, fields)
+
+    # pieces
+
+    def name(self):
+        name = Name(self.expect(NAME))
+        while self.accept(DOT):
+            name = Attribute(name, self.expect(NAME))
+        return name
+
+    def type(self):
+        return Type(self.expect(NAME))
+
+    def argdef(self):
+        return ArgDef(self.name(), self.type())
+
+    def callargs(self):
+        args = [self.node()]
+        while self.accept(COMMA):
+            args.append(self.node())
+        return args
+
+
+def parse(source):
+    return FastParser(TokenBuffer(source)).parse()
+
+def main(args):
+    check = '--check' in args
+    if check:
+        args.remove('--check')
+
+    if args:
+        if os.path.isfile(args[0]):
+            source = pathlib.Path(args[0])
+        else:
+            source = args[0]
+    else:
+        source = sys.stdin.buffer
+
+    if check:
+        from .parse import parse as sly_parse
+        assert parse(source) == sly_parse(source, cache=False), 'the models of the parsers differ'
+        return
+
+    print(parse(source))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,220 @@
+# flat.py
+#
+# Flat encoding of the model, for very large programs.  A FlatTree keeps
+# the nodes in a few parallel arrays, addressed by an integer node id,
+# instead of one python object per node:
+#
+#     kinds[id]       index of the node class in KINDS
+#     offsets[id]     where the operands of the node start in operands,
+#                     they end where those of node id + 1 start
+#     operands        the fields of every node, in the order of the
+#                     class' _fields, each encoded as one int:
+#
+#                         child node    id << 2
+#                         value         index into values << 2 | 1
+#                         None          2
+#                         list          len << 2 | 3, then the items
+#
+#     values          the str/int/float/bool values, each stored once
+#
+# Ids are in preorder: the root is 0, and a node's children come after
+# it, so looping over range(len(tree)) walks the whole tree in order.
+# The arrays copy and pickle without building any nodes.
+#
+#     tree = FlatTree.from_model(model)
+#     model = tree.to_model()
+#
+# Annotations added by passes (_var, _slot, ...) aren't kept.
+
+import pathlib
+import sys
+from array import array
+
+from .model import *
+from .parse import parse
+
+KINDS = sorted(Node.__subclasses__(), key=lambda cls: cls.__name__)
+KIND = {cls: i for i, cls in enumerate(KINDS)}
+
+NODE, VALUE, NONE, LIST = range(4)
+
+
+class FlatTree:
+    def __init__(self, kinds=None, offsets=None, operands=None, values=None):
+        self.kinds = kinds if kinds is not None else array('B')
+        self.offsets = offsets if offsets is not None else array('I')
+        self.operands = operands if operands is not None else array('I')
+        self.values = values if values is not None else []
+
+    @classmethod
+    def from_model(cls, root):
+        tree = cls()
+        kinds = tree.kinds.append
+        offsets = tree.offsets.append
+        operands = tree.operands
+        values = tree.values
+        value_index = {}
+
+        # (node, where its id goes in operands), a node gets its id when
+        # it's popped, which is preorder
+        stack = [(root, None)]
+        while stack:
+            node, pos = stack.pop()
+            i = len(tree.kinds)
+            if pos is not None:
+                operands[pos] = i << 2
+            kinds(KIND[node.__class__])
+            offsets(len(operands))
+
+            children = []
+            for name in node._fields:
+                value = getattr(node, name)
+                if isinstance(value, list):
+                    operands.append(len(value) << 2 | LIST)
+                    items = value
+                else:
+                    items = [value]
+                for item in items:
+                    if isinstance(item, Node):
+                        children.append((item, len(operands)))
+                        operands.append(0)
+                    elif item is None:
+                        operands.append(NONE)
+                    else:
+                        # 1, 1.0 and True are equal keys, keep them apart
+                        key = (item.__class__, item)
+                        j = value_index.get(key)
+                        if j is None:
+                            j = value_index[key] = len(values)
+                            values.append(item)
+                        operands.append(j << 2 | VALUE)
+            stack.extend(reversed(children))
+
+        return tree
+
+    def to_model(self, root=0):
+        '''the model of the subtree at node id root'''
+        # children have higher ids than their parent, build them first
+        nodes = {}
+        for i in reversed(range(root, self.end(root))):
+            cls = KINDS[self.kinds[i]]
+            if cls is Unit:
+                nodes[i] = UNIT
+                continue
+            node = cls.__new__(cls)
+            for name, value in zip(cls._fields, self.fields(i)):
+                if isinstance(value, Ref):
+                    value = nodes[value]
+                elif isinstance(value, list):
+                    value = [nodes[_] if isinstance(_, Ref) else _ for _ in value]
+                setattr(node, name, value)
+            nodes[i] = node
+        return nodes[root]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __eq__(self, other):
+        return (self.kinds == other.kinds and self.offsets == other.offsets and
+                self.operands == other.operands and self.values == other.values)
+
+    def copy(self):
+        return FlatTree(array('B', self.kinds), array('I', self.offsets),
+                        array('I', self.operands), list(self.values))
+
+    def kind(self, i):
+        '''the model class of node i'''
+        return KINDS[self.kinds[i]]
+
+    def decode(self, x):
+        tag = x & 3
+        if tag == NODE:
+            return Ref(x >> 2)
+        if tag == VALUE:
+            return self.values[x >> 2]
+        return None
+
+    def fields(self, i):
+        '''
+        The fields of node i, in the order of the class' _fields, with
+        child nodes as Ref ids
+        '''
+        operands = self.operands
+        pos = self.offsets[i]
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else len(operands)
+        result = []
+        while pos < end:
+            x = operands[pos]
+            pos += 1
+            if x & 3 == LIST:
+                n = x >> 2
+                result.append([self.decode(_) for _ in operands[pos:pos + n]])
+                pos += n
+            else:
+                result.append(self.decode(x))
+        return result
+
+    def field(self, i, name):
+        return self.fields(i)[self.kind(i)._fields.index(name)]
+
+    def children(self, i):
+        '''the ids of the child nodes of node i, in order'''
+        children = []
+        for value in self.fields(i):
+            if isinstance(value, Ref):
+                children.append(value)
+            elif isinstance(value, list):
+                children.extend(_ for _ in value if isinstance(_, Ref))
+        return children
+
+    def end(self, i):
+        '''the id after the last node of the subtree at i'''
+        children = self.children(i)
+        while children:
+            i = children[-1]
+            children = self.children(i)
+        return i + 1
+
+    def ids(self, *classes):
+        '''the ids of all nodes of the given model classes'''
+        kinds = {KIND[_] for _ in classes}
+        return [i for i, kind in enumerate(self.kinds) if kind in kinds]
+
+
+class Ref(int):
+    '''id of a child node, as returned by FlatTree.fields()'''
+    __slots__ = ()
+
+    def __repr__(self):
+        return f'Ref({int(self)})'
+
+
+class FlatVisitor:
+    '''
+    Visits node ids of a FlatTree: visit(i) calls visit_<class name>(i)
+    if there is one, otherwise visits the children of i.
+    '''
+    def __init__(self, tree):
+        self.tree = tree
+        self.methods = [getattr(self, f'visit_{cls.__name__}', self.generic_visit) for cls in KINDS]
+
+    def visit(self, i):
+        return self.methods[self.tree.kinds[i]](i)
+
+    def generic_visit(self, i):
+        for child in self.tree.children(i):
+            self.visit(child)
+
+
+def main(args):
+    if args:
+        source = pathlib.Path(args[0])
+    else:
+        source = sys.stdin.buffer
+
+    tree = FlatTree.from_model(parse(source))
+    for i in range(len(tree)):
+        print(f'{i:6d} {tree.kind(i).__name__:10s} {tree.fields(i)}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
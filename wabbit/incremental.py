@@ -0,0 +1,203 @@
+# incremental.py
+#
+# Incremental parsing, for editors.  A Document keeps the text, the model
+# and where each top-level statement (func, struct, var, ...) starts.
+# An edit relexes from the last top-level statement that starts before
+# it, until the tokens line up again with a statement that starts after
+# it, and reparses only the statements in between.  The model of every
+# other statement is reused as is.
+#
+#     doc = Document(text)
+#     doc.model                          # Block, same as parse(text, parser='fast')
+#     doc.edit(offset, deleted, inserted)
+#     doc.model                          # same as parse(doc.text, parser='fast')
+#
+# The tokens after the edit line up with an old statement when the
+# lexer, started at a token boundary before the edit, produces a token
+# that starts exactly where that statement's first token moved to:
+# from there on the text and the lexer state are the same as before.
+# The boundary it starts at must be one the new text still has: the
+# statements before it can't have a token that the edit extends, a
+# quote on the line of the edit or a /* that isn't closed before it.
+# The statements in between are reparsed on their own, which gives the
+# same result as parsing the whole text if the last one can't go on
+# into the next statement (see fastparse.continues), otherwise the
+# region is extended.  Parsing is done with fastparse.
+
+import bisect
+import sys
+import time
+
+from .fastparse import FastParser, continues
+from .model import *
+from .parse import parse
+from .tokenize import TokenBuffer
+
+
+class Document:
+    '''
+    The text of a program and its model, which edit() keeps the same as
+    parse(text, parser='fast')
+    '''
+    def __init__(self, text):
+        self.text = text
+        self.model = None
+        self.reparse()
+
+    def reparse(self):
+        '''parse the whole text'''
+        self.valid = False
+        buffer = TokenBuffer(self.text)
+        items = FastParser(buffer).items()
+        self.set_items(buffer, items)
+
+    def set_items(self, buffer, items):
+        # per top-level statement: the node, and the offsets and kind of
+        # its first token
+        self.nodes = [node for _, node in items]
+        self.starts = [buffer.starts[i] for i, _ in items]
+        self.ends = [buffer.ends[i] for i, _ in items]
+        self.kinds = [buffer.kinds[i] for i, _ in items]
+        self.model = Block(list(self.nodes))
+        self.valid = True
+
+    def edit(self, offset, deleted, inserted):
+        '''
+        Replace deleted characters at offset by the text inserted, and
+        update the model.  Raises SyntaxError if the new text doesn't
+        parse, the next edit then reparses everything.
+        '''
+        self.text = self.text[:offset] + inserted + self.text[offset + deleted:]
+        if not self.valid:
+            self.reparse()
+            return self.model
+
+        try:
+            self.update(offset, deleted, inserted)
+        except BaseException:
+            self.valid = False
+            raise
+        return self.model
+
+    def update(self, offset, deleted, inserted):
+        text = self.text
+        delta = len(inserted) - deleted
+        starts = self.starts
+        n = len(starts)
+
+        # first statement of the region: its first token must end before
+        # the edit, or it could be part of a different token now, and so
+        # must every token before it
+        bound = self.unchanged(offset)
+        first = bisect.bisect_right(starts, offset) - 1
+        while first >= 0 and (self.ends[first] >= offset or starts[first] > bound):
+            first -= 1
+        pos = starts[first] if first >= 0 else 0
+        first = max(first, 0)
+
+        # the statements after the region, starting with the first one that
+        # is entirely after the edit
+        after = bisect.bisect_left(starts, offset + deleted)
+        last = after
+
+        buffer = TokenBuffer(text, pos, starts[last] + delta if last < n else None)
+        while True:
+            stopped = buffer.stop
+            if stopped is not None:
+                last = bisect.bisect_left(starts, stopped - delta, last)
+                if last == n:
+                    # the tokens went past the start of every statement that
+                    # followed, the region goes on to the end of the text
+                    buffer.stop = stopped = buffer.scan(stopped)
+            if stopped is None:
+                last = n
+
+            if last == n or starts[last] + delta == stopped:
+                items = self.parse_region(buffer, last)
+                if items is not None:
+                    break
+                # the region ends in the middle of a statement, try again
+                # with twice as many statements
+                last = min(n, last + max(1, last - after))
+
+            buffer.stop = buffer.scan(stopped, starts[last] + delta if last < n else None)
+
+        self.splice(first, last, delta, buffer, items)
+
+    def unchanged(self, offset):
+        '''
+        An offset before which the tokens are the same whatever the text
+        after offset is.  The tokens that end before offset are, but for a
+        quote on the line of offset, which a quote after it may close into
+        a char, and a /* that isn't closed before offset.
+        '''
+        text = self.text
+        line = text.rfind('\n', 0, offset) + 1
+        quote = text.find("'", line, offset)
+        bound = offset if quote < 0 else quote
+        opened = text.rfind('/*', 0, bound)
+        while opened >= 0 and text.find('*/', opened + 2, offset) < 0:
+            bound = opened
+            opened = text.rfind('/*', 0, bound)
+        return bound
+
+    def parse_region(self, buffer, last):
+        '''
+        The top-level statements in buffer, or None if they may go on into
+        statement last
+        '''
+        parser = FastParser(buffer)
+        try:
+            items = parser.items()
+        except SyntaxError:
+            if last == len(self.starts) or parser.pos < len(buffer):
+                # an error before the end of the region is an error no
+                # matter what follows
+                raise
+            return None
+
+        if last < len(self.starts) and items and continues(items[-1][1], self.kinds[last]):
+            return None
+        return items
+
+    def splice(self, first, last, delta, buffer, items):
+        self.nodes[first:last] = [node for _, node in items]
+        self.starts[first:last] = [buffer.starts[i] for i, _ in items]
+        self.ends[first:last] = [buffer.ends[i] for i, _ in items]
+        self.kinds[first:last] = [buffer.kinds[i] for i, _ in items]
+
+        # statements after the region moved by delta
+        i = first + len(items)
+        if delta:
+            self.starts[i:] = [_ + delta for _ in self.starts[i:]]
+            self.ends[i:] = [_ + delta for _ in self.ends[i:]]
+
+        self.model = Block(list(self.nodes))
+        self.region = (first, last, len(items), len(buffer))
+
+
+def main(args):
+    '''
+    Time edits of a file against parsing all of it:
+
+        python3 -m wabbit.incremental file.wb offset deleted inserted
+    '''
+    with open(args[0]) as file:
+        text = file.read()
+    offset, deleted, inserted = int(args[1]), int(args[2]), args[3]
+
+    doc = Document(text)
+    start = time.perf_counter()
+    doc.edit(offset, deleted, inserted)
+    t = time.perf_counter() - start
+    first, last, count, ntokens = doc.region
+    print(f'edit: {t * 1000:.3f}ms, reparsed {count} statements ({ntokens} tokens)')
+
+    start = time.perf_counter()
+    model = parse(doc.text, parser='fast')
+    t = time.perf_counter() - start
+    print(f'full: {t * 1000:.3f}ms')
+    assert model == doc.model
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
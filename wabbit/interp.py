@@ -41,61 +41,118 @@
 #
 
 import os.path
+import pathlib
 import sys
 
 from .model import *
+from .output import stream_stdout
 from .parse import parse
-from .scope import *
-
-class DoBreak(Exception):
-    pass
-
-class DoContinue(Exception):
-    pass
-
-class DoReturn(Exception):
-    def __init__(self, value):
-        self.value = value
-
-class Interpreter:
+from .resolve import resolve
+from .trace import Profiler, StepTracer, TRACERS
+from .visitor import DispatchTable, NodeVisitor
+
+# wabbit -> python types
+types = {
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'char': str,
+    'unit': type(UNIT),
+}
+
+# marks global slots that haven't been assigned yet
+UNDEFINED = object()
+
+# Completion signals for break, continue and return.  Executing a
+# statement normally returns None (or the value of an expression
+# statement); abrupt completion returns a (kind, value) pair instead,
+# which Block, While and do_call pass up or act on.  No wabbit value is
+# a tuple, so checking the class is enough to tell them apart.
+Signal = tuple
+
+BREAK = ('break', None)
+CONTINUE = ('continue', None)
+RETURN = 'return'
+
+class Interpreter(NodeVisitor):
     # TODO
     # - Program node, so Block doesn't need to return
     # - Scope only if var/const in a block?
 
-    def __init__(self):
-        self.env = Scopes()
-        self.stdout = []
+    def __init__(self, tracer=None, stdout=None):
+        self.names = []     # global names, by slot
+        self.globals = []
+        self.frame = None
+        self.stdout = stdout if stdout is not None else []
+
+        self.tracer = tracer
+        if tracer is not None:
+            # shadow the hooked methods with traced versions, so the
+            # untraced interpreter never checks for a tracer
+            self.visit = self.trace_visit
+            self.do_call = self.trace_do_call
+            self.visit_table = DispatchTable(type(self), 'visit', {Print: type(self).trace_visit_Print})
 
     def interpret(self, node):
+        self.names = resolve(node)
+        self.globals = [UNDEFINED] * len(self.names)
+        self.frame = [None] * node._nslots
+
+        if self.tracer is not None:
+            self.tracer.start(node)
+
         ret = self.visit(node)
 
-        if isinstance(self.env.global_scope.get('main'), Func):
-            ret = self.visit(Call(Name('main'), []))
+        main = self.global_scope.get('main')
+        if isinstance(main, Func):
+            ret = self.do_call(main, [])
 
-        assert self.env is not None and len(self.env) == 1
+        if self.tracer is not None:
+            self.tracer.stop()
 
-        return ret, self.env.global_scope, self.stdout
+        return ret, self.global_scope, self.stdout
+
+    @property
+    def global_scope(self):
+        return global_scope(self.names, self.globals)
 
     def visit(self, node):
         assert node is not None
-        m = getattr(self, f'visit_{node.__class__.__name__}')
-        x = m(node)
-        if '--debug' in sys.argv:
-            print('visit', node, '-->', x)
-            input()
+        return self.visit_table[node.__class__](self, node)
+
+    def trace_visit(self, node):
+        self.tracer.enter(node)
+        x = type(self).visit(self, node)
+        self.tracer.exit(node, x)
         return x
 
+    def trace_do_call(self, func, args):
+        self.tracer.call(func, args)
+        ret = type(self).do_call(self, func, args)
+        self.tracer.ret(func, ret)
+        return ret
+
+    def trace_visit_Print(self, node):
+        value = self.visit(node.arg)
+        self.stdout.append(value)
+        self.tracer.print(value)
+
     def visit_Name(self, node):
-        return self.env[node.value]
+        slot = node._slot
+        if slot >= 0:
+            return self.frame[slot]
+        return self.globals[~slot]
+
+    def store(self, node, value):
+        # node is a resolved Name
+        slot = node._slot
+        if slot >= 0:
+            self.frame[slot] = value
+        else:
+            self.globals[~slot] = value
 
     def visit_Type(self, node):
-        return {
-            'int': int,
-            'float': float,
-            'bool': bool,
-            'char': str,
-            'unit': type(UNIT),
-        }[node.type]
+        return types[node.type]
 
     def visit_Integer(self, node):
         return node.value
@@ -146,7 +203,7 @@ class Interpreter:
             '!=': lambda a, b: a!=b,
             '==': lambda a, b: a==b,
             '&&': lambda a, b: a and b,
-            '||': lambda a, b: a and b,
+            '||': lambda a, b: a or b,
         }[node.op](left, right)
 
     def visit_UnaOp(self, node):
@@ -156,32 +213,32 @@ class Interpreter:
             '!': lambda a: not a,
         }[node.op](self.visit(node.arg))
 
-    @new_scope()
     def visit_Block(self, node):
         for n in node.statements:
-            self.visit(n)
+            r = self.visit(n)
+            if r.__class__ is Signal:
+                return r
 
-    @new_scope()
     def visit_Compound(self, node):
         ret = None
         for n in node.statements:
             ret = self.visit(n)
+            if ret.__class__ is Signal:
+                break
         return ret
 
     def visit_Print(self, node):
         self.stdout.append(self.visit(node.arg))
 
     def visit_Const(self, node):
-        name = node.name.value
         v = self.visit(node.arg)
-        self.env.define(name, v)
+        self.store(node.name, v)
 
         if node.type is not None:
             t = self.visit(node.type)
             assert isinstance(v, t), (v, t)
 
     def visit_Var(self, node):
-        name = node.name.value
         arg = self.visit(node.arg) if node.arg is not None else None
         typ = self.visit(node.type) if node.type is not None else None
 
@@ -191,15 +248,14 @@ class Interpreter:
         if arg is None and typ is not None:
             arg = typ()
 
-        self.env.define(name, arg)
+        self.store(node.name, arg)
 
     def visit_Assign(self, node):
         # FIXME, protect const somehow?
         arg = self.visit(node.arg)
 
         if isinstance(node.name, Name):
-            name = node.name.value
-            self.env[name] = arg
+            self.store(node.name, arg)
             return
 
         # Attribute - recursively lookup the dict to set the value in...
@@ -209,7 +265,7 @@ class Interpreter:
 
     def resolve_Attribute(self, node):
         if isinstance(node, Name):
-            return self.env[node.value]
+            return self.visit_Name(node)
         return self.resolve_Attribute(node.name)[node.attr]
 
     def visit_If(self, node):
@@ -220,31 +276,31 @@ class Interpreter:
 
     def visit_While(self, node):
         while self.visit(node.cond):
-            try:
-                self.visit(node.block)
-            except DoBreak:
-                break
-            except DoContinue:
-                pass
+            r = self.visit(node.block)
+            if r.__class__ is Signal:
+                if r is BREAK:
+                    break
+                if r is not CONTINUE:
+                    # return
+                    return r
 
     def visit_Func(self, node):
         # just store the function node into the global scope, see Call for
         # calling...
-        assert len(self.env) == 1, 'Nested function definition'
-        self.env.global_scope[node.name.value] = node
+        self.store(node.name, node)
 
     def visit_Return(self, node):
-        raise DoReturn(self.visit(node.value))
+        return (RETURN, self.visit(node.value))
 
     def visit_Continue(self, node):
-        raise DoContinue()
+        return CONTINUE
 
     def visit_Break(self, node):
-        raise DoBreak()
+        return BREAK
 
     def visit_Call(self, node):
-        # functions all in the global scope?
-        func = self.env.global_scope[node.name.value]
+        # functions all in the global scope
+        func = self.visit_Name(node.name)
 
         if isinstance(func, Struct):
             struct = func
@@ -258,34 +314,31 @@ class Interpreter:
                 values[field.name.value] = self.visit(arg)
             return values
 
-        # visit args and put them into current scope
+        # visit args, they're the first slots of the new frame
         assert len(func.args) == len(node.args)
-        args = {}
-        for farg, arg in zip(func.args, node.args):
-            args[farg.name.value] = self.visit(arg)
+        args = [self.visit(arg) for arg in node.args]
 
-        return self.do_call(func.block, args)
+        return self.do_call(func, args)
 
-    @new_scope(CallScope)
-    def do_call(self, node, args):
-        for k, v in args.items():
-            self.env.define(k, v)
+    def do_call(self, func, args):
+        frame = self.frame
+        self.frame = args + [None] * (func._nslots - len(args))
 
         ret = None
 
-        try:
-            for n in node.statements:
-                self.visit(n)
-        except DoReturn as e:
-            ret = e.value
+        for n in func.block.statements:
+            r = self.visit(n)
+            if r.__class__ is Signal:
+                ret = r[1]
+                break
 
+        self.frame = frame
         return ret
 
     def visit_Struct(self, node):
         # just store this model in the env, we'll use it later to create
         # instances...
-        assert len(self.env) == 1, 'Nested scope definition'
-        self.env.global_scope[node.name.value] = node
+        self.store(node.name, node)
 
     def visit_Field(self, node):
         return node.name.value, self.visit(node.name)
@@ -310,30 +363,84 @@ class Interpreter:
         return f'{self.visit(node.name)}{type}'
 
 
-def interpret(text_or_node):
+def global_scope(names, values):
+    '''dict of the defined globals'''
+    return {
+        name: value
+        for name, value in zip(names, values)
+        if value is not UNDEFINED
+    }
+
+def interpret(text_or_node, engine='tree', tracer=None, stdout=None):
+    '''
+    Run a program, returns (ret, globals, stdout).  stdout is where the
+    output goes, by default a list of the printed values.
+    '''
     node = text_or_node
     if not isinstance(text_or_node, Node):
         node = parse(text_or_node)
-    return Interpreter().interpret(node)
+
+    if tracer is not None and engine != 'tree':
+        raise ValueError('Tracing needs the tree engine')
+
+    if engine == 'closure':
+        from .closure import ClosureInterpreter
+        return ClosureInterpreter(stdout).interpret(node)
+
+    if engine == 'vm':
+        from .bytecode import compile_program, run
+        return run(compile_program(node), stdout)
+
+    if engine != 'tree':
+        raise ValueError(engine)
+    return Interpreter(tracer, stdout).interpret(node)
 
 def main(args):
+    engine = 'tree'
+    if '--engine' in args:
+        i = args.index('--engine')
+        engine = args[i+1]
+        args = args[:i] + args[i+2:]
+
+    tracer = None
+    if '--debug' in args:
+        args.remove('--debug')
+        tracer = StepTracer()
+    if '--trace' in args:
+        i = args.index('--trace')
+        tracer = TRACERS[args[i+1]]()
+        args = args[:i] + args[i+2:]
+    if '--profile' in args:
+        args.remove('--profile')
+        tracer = Profiler()
+    flamegraph = None
+    if '--flamegraph' in args:
+        i = args.index('--flamegraph')
+        flamegraph = args[i+1]
+        args = args[:i] + args[i+2:]
+        tracer = Profiler()
+
     if args:
         if os.path.isfile(args[0]):
-            with open(args[0]) as file:
-                text = file.read()
+            # a path, so parse() can use its cache
+            source = pathlib.Path(args[0])
         else:
-            text = args[0]
+            source = args[0]
     else:
-        text = sys.stdin.read()
-
-    ret, env, stdout = interpret(text)
-    for s in stdout:
-        if not isinstance(s, str):
-            if isinstance(s, bool):
-                s = 'true' if s else 'false'
-            print(s)
-        else:
-            sys.stdout.write(s)
+        source = sys.stdin.read()
+
+    # when stepping, show each print right away between the steps
+    flush = 'always' if isinstance(tracer, StepTracer) else None
+    with stream_stdout(flush=flush) as stdout:
+        interpret(source, engine, tracer, stdout)
+
+    if tracer is not None:
+        tracer.report()
+
+    if flamegraph is not None:
+        with open(flamegraph, 'w') as file:
+            for line in tracer.collapsed():
+                print(line, file=file)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+# lrcache.py
+#
+# Cache the LALR tables of sly parsers on disk.  sly builds the tables
+# when the parser class is defined, so every process that imports the
+# parser pays for it.  Building the grammar itself is cheap, so that's
+# still done on import; the grammar (all the productions, in order) and
+# the precedence are hashed, and the tables are loaded from the cache if
+# the hash matches.  Otherwise they're built as usual and saved.
+#
+# To use it, derive the parser from CachedParser instead of sly.Parser:
+#
+#     class WabbitParser(CachedParser):
+#         ...
+#
+# The cache files go in the __pycache__ directory next to this module,
+# or in $WABBIT_CACHE_DIR if that's set.  A cache that can't be written
+# is silently skipped.
+
+import hashlib
+import marshal
+import os
+
+import sly
+from sly.yacc import YaccError
+
+FORMAT = 1
+
+# the private methods of sly.Parser that _build() calls, a sly that
+# doesn't have them builds the tables itself, without the cache
+PRIVATE = (
+    '_Parser__collect_rules',
+    '_Parser__validate_specification',
+    '_Parser__build_grammar',
+    '_Parser__build_lrtables',
+)
+
+
+class LRTables:
+    '''The parts of a sly LRTable that Parser.parse() needs'''
+
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+
+def cache_dir():
+    return os.environ.get('WABBIT_CACHE_DIR') or os.path.join(os.path.dirname(__file__), '__pycache__')
+
+def grammar_key(grammar):
+    '''hash of everything the tables are built from'''
+    h = hashlib.sha256()
+    for item in (FORMAT, sly.__version__, marshal.version, grammar.Start):
+        h.update(f'{item}\n'.encode())
+    for p in grammar.Productions:
+        h.update(f'{p}\n'.encode())
+    for term, prec in sorted(grammar.Precedence.items()):
+        h.update(f'{term} {prec}\n'.encode())
+    return h.hexdigest()
+
+def load_tables(filename, key):
+    try:
+        with open(filename, 'rb') as f:
+            data = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(data, tuple) or len(data) != 6 or data[0] != key:
+        return None
+    return data[1:]
+
+def save_tables(filename, data):
+    tmp = f'{filename}.{os.getpid()}'
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(tmp, filename)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+class CachedParser(sly.Parser):
+    '''sly.Parser that caches its tables on disk'''
+
+    @classmethod
+    def _build(cls, definitions):
+        if vars(cls).get('_build', False):
+            return
+
+        if cls.debugfile or not all(hasattr(cls, _) for _ in PRIVATE):
+            # the debug output needs the full LRTable, and a sly without
+            # the private methods builds it its own way
+            return super()._build(definitions)
+
+        # same steps as sly.Parser._build
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise YaccError('Invalid parser specification')
+        cls._Parser__build_grammar(rules)
+
+        key = grammar_key(cls._grammar)
+        filename = os.path.join(cache_dir(), f'{cls.__module__}.{cls.__qualname__}.lrtab')
+
+        data = load_tables(filename, key)
+        if data is not None:
+            action, goto, defaulted, num_sr, num_rr = data
+            cls._lrtable = LRTables(action, goto, defaulted)
+            # same warnings as when the tables are built
+            if num_sr and num_sr != getattr(cls, 'expected_shift_reduce', None):
+                cls.log.warning('%d shift/reduce conflict%s', num_sr, 's' if num_sr > 1 else '')
+            if num_rr and num_rr != getattr(cls, 'expected_reduce_reduce', None):
+                cls.log.warning('%d reduce/reduce conflict%s', num_rr, 's' if num_rr > 1 else '')
+            return
+
+        if not cls._Parser__build_lrtables():
+            raise YaccError('Can\'t build parsing tables')
+
+        lr = cls._lrtable
+        save_tables(filename, (
+            key,
+            lr.lr_action,
+            lr.lr_goto,
+            lr.defaulted_states,
+            len(lr.sr_conflicts),
+            len(lr.rr_conflicts),
+        ))
@@ -46,36 +46,190 @@
 # Feel free to modify as appropriate.  You don't even have to use classes
 # if you want to go in a different direction with it.
 
+import os
+
 NoneType = type(None)
 
+# The constructors check their arguments only when checking is on: set
+# WABBIT_CHECK=1 in the environment (test.sh does), or call
+# check_nodes().  Every node class defines __slots__, so nodes have no
+# __dict__.
+CHECK = os.environ.get('WABBIT_CHECK', '') not in ('', '0')
+
+def check_nodes(on=True):
+    global CHECK
+    CHECK = on
+
+def fields(node):
+    '''the attributes of a node, without annotations (_var, _slot, ...) added by passes'''
+    return {k: getattr(node, k) for k in node._fields}
+
+# annotations added by passes, and their value until they are set.  Node
+# has slots for all but _slot, which only Name has.  _hash is the cached
+# structural hash: a node that has been hashed is frozen, change its
+# fields with set_field(), or call clear_hashes() after changing it.
+ANNOTATIONS = {
+    '_var': '',
+    '_type': None,
+    '_slot': None,
+    '_nslots': 0,
+    '_hash': None,
+}
+
+def structural_hash(root):
+    '''
+    Hash of the class and fields of root, computed bottom-up for the nodes
+    whose hash isn't cached yet, and cached in _hash
+    '''
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if ready:
+            key = [node.__class__]
+            for name in node._compared:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    value = value._hash
+                elif isinstance(value, list):
+                    value = tuple(_._hash if isinstance(_, Node) else _ for _ in value)
+                key.append(value)
+            node._hash = hash(tuple(key))
+        elif node._hash is None:
+            stack.append((node, True))
+            for name in node._compared:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    stack.append((value, False))
+                elif isinstance(value, list):
+                    stack.extend((_, False) for _ in value if isinstance(_, Node))
+    return root._hash
+
+def clear_hashes(root):
+    '''
+    Forget the cached hashes in the tree under root.  Call it after
+    changing the fields of a node in place, with root the top of every
+    tree that holds the node.
+    '''
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node._hash = None
+        for value in fields(node).values():
+            if isinstance(value, Node):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(_ for _ in value if isinstance(_, Node))
+
+def set_field(root, node, name, value):
+    '''
+    Set the field name of node, in the tree under root, to value, and
+    forget the cached hashes it changes: node's and those of the nodes
+    above it.  A node in several trees needs it for each of them.
+    '''
+    # the parent of every node on the way down to node
+    parents = {id(root): None}
+    stack = [root]
+    while stack:
+        n = stack.pop()
+        if n is node:
+            break
+        for v in fields(n).values():
+            if isinstance(v, Node):
+                parents[id(v)] = n
+                stack.append(v)
+            elif isinstance(v, list):
+                for _ in v:
+                    if isinstance(_, Node):
+                        parents[id(_)] = n
+                        stack.append(_)
+    else:
+        raise ValueError(f'{node} is not in the tree')
+
+    setattr(node, name, value)
+    while node is not None:
+        node._hash = None
+        node = parents[id(node)]
+
 class Node:
+    __slots__ = ('_var', '_type', '_nslots', '_hash')
     is_statement = False
-    _var = ''
-    _type = None
+    _fields = ()
+    _compared = ()
+
+    def __init_subclass__(cls):
+        # the slots of the class that aren't annotations, in order, and
+        # the ones that equality and the hash look at
+        cls._fields = tuple(_ for _ in cls.__dict__.get('__slots__', ()) if not _.startswith('_'))
+        if '_compared' not in cls.__dict__:
+            cls._compared = cls._fields
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set
+        try:
+            return ANNOTATIONS[name]
+        except KeyError:
+            raise AttributeError(f'{self.__class__.__name__!r} object has no attribute {name!r}') from None
+
+    def __hash__(self):
+        h = self._hash
+        if h is None:
+            h = structural_hash(self)
+        return h
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if self is other:
+            return True
+        if self.__class__ is not other.__class__:
+            return NotImplemented if not isinstance(other, Node) else False
+        # different hashes, different trees, without looking further
+        if hash(self) != hash(other):
+            return False
+        for name in self._compared:
+            if getattr(self, name) != getattr(other, name):
+                return False
+        return True
+
+    def check(self):
+        pass
 
 class Name(Node):
+    __slots__ = ('value', '_slot')
+
     def __init__(self, value):
-        assert isinstance(value, str)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, str)
 
     def __repr__(self):
         return f'Name({self.value})'
 
 class Type(Node):
+    __slots__ = ('type',)
+
     def __init__(self, type):
-        assert isinstance(type, str)
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.type, str)
 
     def __repr__(self):
         return f'Type({self.type})'
 
 class Char(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        assert isinstance(value, str)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, str)
 
     def unescape(self):
         return self.value.encode('utf8').decode('unicode_escape')
@@ -87,9 +241,15 @@ class Integer(Node):
     '''
     Example: 42
     '''
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        assert isinstance(value, int)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, int)
 
     def __repr__(self):
         return f'Integer({self.value})'
@@ -98,26 +258,42 @@ class Float(Node):
     '''
     Example: 42.0
     '''
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        assert isinstance(value, float)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, float)
 
     def __repr__(self):
         return f'Float({self.value})'
 
 class Bool(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        assert isinstance(value, bool)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, bool)
 
     def __repr__(self):
         return f'Bool({self.value})'
 
 class Break(Node):
+    __slots__ = ()
+
     def __repr__(self):
         return f'Break()'
 
 class Continue(Node):
+    __slots__ = ()
+
     def __repr__(self):
         return f'Continue()'
 
@@ -125,13 +301,19 @@ class BinOp(Node):
     '''
     Example: left + right
     '''
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, op, left, right):
-        assert op in ('+', '-', '/', '*', '<', '>', '<=', '>=', '!=', '==', '&&', '||'), op
-        assert isinstance(left, Node)
-        assert isinstance(right, Node)
         self.op = op
         self.left = left
         self.right = right
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert self.op in ('+', '-', '/', '*', '<', '>', '<=', '>=', '!=', '==', '&&', '||'), self.op
+        assert isinstance(self.left, Node)
+        assert isinstance(self.right, Node)
 
     def __repr__(self):
         return f'BinOp({self.op}, {self.left}, {self.right})'
@@ -140,11 +322,17 @@ class UnaOp(Node):
     '''
     Example: left + right
     '''
+    __slots__ = ('op', 'arg')
+
     def __init__(self, op, arg):
-        assert op in ('-', '+', '!')
-        assert isinstance(arg, Node)
         self.op = op
         self.arg = arg
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert self.op in ('-', '+', '!')
+        assert isinstance(self.arg, Node)
 
     def __repr__(self):
         return f'UnaOp({self.op}, {self.arg})'
@@ -157,52 +345,74 @@ class Block(Node):
     stmt2;
     stmt3;
     '''
+    __slots__ = ('statements', 'indent')
+    _compared = ('statements',)
+
     def __init__(self, statements, indent=''):
-        assert isinstance(statements, list)
-        assert indent == '' or set(indent) == {' '}
         self.statements = statements
         self.indent = indent
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.statements, list)
+        assert self.indent == '' or set(self.indent) == {' '}
 
     def __repr__(self):
         indent = f", indent='{self.indent}'" if self.indent else ''
         return f'Block({[_ for _ in self.statements]}{indent})'
 
-    def __eq__(self, other):
-        return dict(self.__dict__, **{'indent': ''}) == dict(other.__dict__, **{'indent': ''})
-
 class Print(Node):
     '''
     Print is kinda a special case of a function call - optional parens
     '''
+    __slots__ = ('arg',)
+
     def __init__(self, arg):
-        assert isinstance(arg, Node)
         self.arg = arg
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.arg, Node)
 
     def __repr__(self):
         return f'Print({self.arg})'
 
 class Const(Node):
+    __slots__ = ('name', 'arg', 'type')
+
     def __init__(self, name, arg, type=None):
-        assert isinstance(name, Name)
-        assert isinstance(arg, Node)
-        assert isinstance(type, (Type, NoneType))
         self.name = name
         self.arg = arg
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.arg, Node)
+        assert isinstance(self.type, (Type, NoneType))
 
     def __repr__(self):
         type = f', type={self.type}' if self.type is not None else ''
         return f'Const({self.name}, {self.arg}{type})'
 
 class Var(Node):
+    __slots__ = ('name', 'arg', 'type')
+
     def __init__(self, name, arg=None, type=None):
-        assert isinstance(name, Name)
-        assert isinstance(arg, (Node, NoneType))
-        assert isinstance(type, (Type, NoneType))
-        assert arg is not None or type is not None
         self.name = name
         self.arg = arg
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.arg, (Node, NoneType))
+        assert isinstance(self.type, (Type, NoneType))
+        assert self.arg is not None or self.type is not None
 
     def __repr__(self):
         arg = f', {self.arg}' if self.arg is not None else ''
@@ -210,67 +420,93 @@ class Var(Node):
         return f'Var({self.name}{arg}{type})'
 
 class Assign(Node):
+    __slots__ = ('name', 'arg')
+
     def __init__(self, name, arg):
-        assert isinstance(name, (Name, Attribute))
-        assert isinstance(arg, Node)
         self.name = name
         self.arg = arg
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, (Name, Attribute))
+        assert isinstance(self.arg, Node)
 
     def __repr__(self):
         return f'Assign({self.name}, {self.arg})'
 
 class If(Node):
+    __slots__ = ('cond', 'block', 'eblock')
     is_statement = True
 
     def __init__(self, cond, block, eblock=None):
-        assert isinstance(cond, Node)
-        assert isinstance(block, Block)
-        assert isinstance(eblock, (Block, NoneType))
         self.cond = cond
         self.block = block
         self.eblock = eblock
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.cond, Node)
+        assert isinstance(self.block, Block)
+        assert isinstance(self.eblock, (Block, NoneType))
 
     def __repr__(self):
         els = f', {self.eblock}' if self.eblock is not None else ''
         return f'If({self.cond}, {self.block}{els})'
 
 class While(Node):
+    __slots__ = ('cond', 'block')
     is_statement = True
 
     def __init__(self, cond, block):
-        assert isinstance(cond, Node)
-        assert isinstance(block, Block)
         self.cond = cond
         self.block = block
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.cond, Node)
+        assert isinstance(self.block, Block)
 
     def __repr__(self):
         return f'While({self.cond}, {self.block})'
 
 class Compound(Node):
+    __slots__ = ('statements',)
+
     def __init__(self, statements):
-        assert isinstance(statements, list)
-        assert all(isinstance(_, Node) for _ in statements)
         self.statements = statements
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.statements, list)
+        assert all(isinstance(_, Node) for _ in self.statements)
 
     def __repr__(self):
         return f'Compound({self.statements})'
 
 class Func(Node):
+    __slots__ = ('name', 'args', 'ret_type', 'block')
     is_statement = True
 
     def __init__(self, name, block, args=None, ret_type=None):
-        assert isinstance(name, Name)
-        assert isinstance(block, Block)
-        args = args or []
-        assert isinstance(args, list)
-        assert all(isinstance(_, ArgDef) for _ in args)
         if ret_type is None:
             ret_type = Type('unit')
-        assert isinstance(ret_type, Type)
         self.name = name
-        self.args = args
+        self.args = args or []
         self.ret_type = ret_type
         self.block = block
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.block, Block)
+        assert isinstance(self.args, list)
+        assert all(isinstance(_, ArgDef) for _ in self.args)
+        assert isinstance(self.ret_type, Type)
 
     def __repr__(self):
         args = (', '+ repr(self.args)) if self.args else ''
@@ -278,99 +514,146 @@ class Func(Node):
         return f'Func({self.name}, {self.block}{args}{ret_type})'
 
 class Return(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        assert isinstance(value, Node)
         self.value = value
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.value, Node)
 
     def __repr__(self):
         return f'Return({self.value})'
 
 class ArgDef(Node):
     '''arg definition in a function definition'''
+    __slots__ = ('name', 'type')
+
     def __init__(self, name, type):
-        assert isinstance(name, Name)
-        assert isinstance(type, Type)
         self.name = name
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.type, Type)
 
     def __repr__(self):
         return f'ArgDef({self.name}, {self.type})'
 
 class Field(Node):
     '''field of a function struct'''
+    __slots__ = ('name', 'type')
+
     def __init__(self, name, type):
-        assert isinstance(name, Name)
-        assert isinstance(type, Type)
         self.name = name
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.type, Type)
 
     def __repr__(self):
         return f'Field({self.name}, {self.type})'
 
 class Call(Node):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name, args):
-        assert isinstance(name, Name)
-        args = args or []
-        assert isinstance(args, list)
-        assert all(isinstance(_, Node) for _ in args)
         self.name = name
-        self.args = args
+        self.args = args or []
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.args, list)
+        assert all(isinstance(_, Node) for _ in self.args)
 
     def __repr__(self):
         args = (', ' + repr(self.args)) if self.args else ''
         return f'Call({self.name}{args})'
 
 class Struct(Node):
+    __slots__ = ('name', 'fields')
     is_statement = True
 
     def __init__(self, name, fields):
-        assert isinstance(name, Name)
-        assert isinstance(fields, list)
-        assert all(isinstance(_, Field) for _ in fields)
-        assert len(fields) > 0
         self.name = name
         self.fields = fields
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.fields, list)
+        assert all(isinstance(_, Field) for _ in self.fields)
+        assert len(self.fields) > 0
 
     def __repr__(self):
         return f'Struct({self.name}, {self.fields})'
 
 class Enum(Node):
+    __slots__ = ('name', 'args')
     is_statement = True
 
     def __init__(self, name, args):
-        assert isinstance(name, Name)
-        assert isinstance(args, list)
-        assert all(isinstance(_, Node) for _ in args)
-        assert len(args) > 0
         self.name = name
         self.args = args
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.args, list)
+        assert all(isinstance(_, Node) for _ in self.args)
+        assert len(self.args) > 0
 
     def __repr__(self):
         return f'Enum({self.name}, {self.args})'
 
 class Member(Node):
     '''member of an enum definition'''
+    __slots__ = ('name', 'type')
+
     def __init__(self, name, type=None):
-        assert isinstance(name, Name)
-        assert isinstance(type, (Type, NoneType))
         self.name = name
         self.type = type
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, Name)
+        assert isinstance(self.type, (Type, NoneType))
 
     def __repr__(self):
         type = f', {self.type}' if self.type is not None else ''
         return f'Member({self.name}{type})'
 
 class Attribute(Node):
+    __slots__ = ('name', 'attr')
+
     def __init__(self, name, attr):
-        assert isinstance(name, (Name, Attribute))
-        assert isinstance(attr, str)
         self.name = name
         self.attr = attr
+        if CHECK:
+            self.check()
+
+    def check(self):
+        assert isinstance(self.name, (Name, Attribute))
+        assert isinstance(self.attr, str)
 
     def __repr__(self):
         return f'Attribute({self.name}, {self.attr})'
 
 class Unit(Node):
+    __slots__ = ()
+
     def __repr__(self):
         return f'Unit()'
 
@@ -0,0 +1,93 @@
+# output.py
+#
+# Where the output of 'print' goes.  All the engines just call
+# stdout.append(value) for each print, so the output can be:
+#
+#   - a plain list, capturing the raw python values.  This is what the
+#     tests in script_models.py etc. check against.
+#
+#   - a StreamOutput, which formats each value as it's printed and
+#     writes the bytes to a file descriptor through a buffer.
+
+import os
+
+def format_bool(value):
+    return 'true\n' if value else 'false\n'
+
+def format_number(value):
+    return f'{value}\n'
+
+def format_char(value):
+    return value
+
+# python type -> formatter, chars are printed as-is, everything else
+# gets a newline
+formatters = {
+    bool: format_bool,
+    int: format_number,
+    float: format_number,
+    str: format_char,
+}
+
+def format_value(value):
+    f = formatters.get(value.__class__)
+    if f is None:
+        # unit, structs, ...
+        return f'{value}\n'
+    return f(value)
+
+
+class StreamOutput:
+    '''
+    Buffered output to a file descriptor.
+
+    flush policy:
+        'full'   - write when the buffer holds buffer_size characters
+        'line'   - also write at the end of every line
+        'always' - write on every print
+    '''
+    def __init__(self, fd=1, buffer_size=64 * 1024, flush='full', encoding='utf8'):
+        assert flush in ('full', 'line', 'always'), flush
+        self.fd = fd
+        self.buffer_size = buffer_size
+        self.policy = flush
+        self.encoding = encoding
+        self.buffer = []
+        self.size = 0
+
+    def append(self, value):
+        s = format_value(value)
+        self.buffer.append(s)
+        self.size += len(s)
+
+        if (self.size >= self.buffer_size
+                or self.policy == 'always'
+                or (self.policy == 'line' and s.endswith('\n'))):
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = ''.join(self.buffer).encode(self.encoding)
+        self.buffer = []
+        self.size = 0
+        while data:
+            n = os.write(self.fd, data)
+            data = data[n:]
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_stdout(flush=None, **kwargs):
+    '''StreamOutput for the process stdout, line buffered on a terminal'''
+    fd = 1
+    if flush is None:
+        flush = 'line' if os.isatty(fd) else 'full'
+    return StreamOutput(fd, flush=flush, **kwargs)
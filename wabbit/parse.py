@@ -115,15 +115,15 @@
 #    - ANTLR (https://www.antlr.org).
 
 import os.path
+import pathlib
 import sys
 
-import sly
-
+from .lrcache import CachedParser
 from .model import *
-from .tokenize import tokenize, WabbitLexer
+from .tokenize import TokenBuffer, WabbitLexer, map_file
 
 
-class WabbitParser(sly.Parser):
+class WabbitParser(CachedParser):
 #    debugfile = 'parser.txt'
 
     tokens = WabbitLexer.tokens
@@ -150,11 +150,11 @@ class WabbitParser(sly.Parser):
     def node(self, p):
         return p.node
 
-    @_(*[f'{op} node %prec UNARY' for op in WabbitLexer._unaop])
+    @_(*[f'{op} node %prec UNARY' for op in sorted(WabbitLexer._unaop)])
     def node(self, p):
         return UnaOp(p[0], p.node)
 
-    @_(*[f'node {op} node' for op in WabbitLexer._binop])
+    @_(*[f'node {op} node' for op in sorted(WabbitLexer._binop)])
     def node(self, p):
         op = p[1]
         left = p.node0
@@ -273,24 +273,64 @@ class WabbitParser(sly.Parser):
     def type(self, p):
         return Type(p.NAME)
 
+    errors = 0
 
-def parse(text):
-    tokens = tokenize(text)
-    parser = WabbitParser()
-    model = parser.parse(tokens)
+    def error(self, token):
+        self.errors += 1
+        super().error(token)
+
+
+def parse(source, parser='sly', cache=True):
+    '''
+    Parse source to a model, with the sly WabbitParser or with the faster
+    hand-written parser in fastparse.py (parser='fast').  source is
+    anything tokenize() takes: text, or a file as a path or binary file.
+
+    The model of a file given as a path (pathlib.Path) is cached, and
+    the file isn't parsed again until it changes, see
+    wbc.cached_parse().  cache=False always parses.
+    '''
+    if cache and isinstance(source, os.PathLike):
+        from .wbc import cached_parse
+        with open(source, 'rb') as f:
+            data = map_file(f) or f.read()
+        return cached_parse(data, parser, lambda data: parse_errors(data, parser))
+
+    model, errors = parse_errors(source, parser)
     return model
 
+def parse_errors(source, parser='sly'):
+    '''
+    parse() without the cache, returns the model and the number of errors
+    reported on the way: illegal characters, and syntax errors sly
+    recovered from
+    '''
+    buffer = TokenBuffer(source)
+    if parser == 'fast':
+        from .fastparse import FastParser
+        return FastParser(buffer).parse(), buffer.errors
+
+    assert parser == 'sly', parser
+    parser = WabbitParser()
+    model = parser.parse(iter(buffer))
+    return model, buffer.errors + parser.errors
+
 def main(args):
+    parser = 'sly'
+    if '--parser' in args:
+        i = args.index('--parser')
+        parser = args[i+1]
+        args = args[:i] + args[i+2:]
+
     if args:
         if os.path.isfile(args[0]):
-            with open(args[0]) as file:
-                text = file.read()
+            source = pathlib.Path(args[0])
         else:
-            text = args[0]
+            source = args[0]
     else:
-        text = sys.stdin.read()
+        source = sys.stdin.buffer
 
-    print(parse(text))
+    print(parse(source, parser))
 
 if __name__ == '__main__':
     main(sys.argv[1:])
@@ -0,0 +1,156 @@
+# resolve.py
+#
+# Static name resolution.  Wabbit scoping is fully static: a name
+# refers either to a variable declared in an enclosing block of the
+# current function, or to something in the global scope.  Functions
+# can't be nested, so there are no closures to worry about.
+#
+# This pass walks the model once ahead of time and gives every
+# variable a fixed slot:
+#
+#   - each top-level declaration (var, const, func, struct) gets a
+#     slot in the globals list
+#
+#   - every other declaration (function arguments, variables in blocks)
+#     gets a slot in the frame of the enclosing function.  Blocks don't
+#     need their own frames, a variable declared in a nested block just
+#     gets the next free slot of the function.  Top-level code that
+#     isn't at the outermost level (e.g. the body of a while loop) runs
+#     in a frame of its own.
+#
+# The results are stored on the model:
+#
+#   Name._slot    >= 0 : index into the current frame
+#                  < 0 : ~_slot is the index into the globals list
+#   Func._nslots       : frame size for calls to the function
+#   Block._nslots      : frame size for the top-level code (program only)
+
+from .model import *
+from .visitor import NodeVisitor
+
+
+class Resolver(NodeVisitor):
+    def __init__(self):
+        self.globals = []       # global names, by slot
+        self.global_index = {}  # name -> global slot
+        self.scopes = None      # dicts of name -> frame slot, innermost last
+        self.nslots = 0
+
+    def resolve(self, node):
+        self.scopes = []
+        self.nslots = 0
+
+        if isinstance(node, Block):
+            for n in node.statements:
+                self.visit(n)
+        else:
+            self.visit(node)
+
+        node._nslots = self.nslots
+        return self.globals
+
+    def global_name(self, name):
+        i = self.global_index.get(name)
+        if i is None:
+            i = self.global_index[name] = len(self.globals)
+            self.globals.append(name)
+        return ~i
+
+    def declare(self, node):
+        # node is the Name being declared
+        if not self.scopes:
+            node._slot = self.global_name(node.value)
+            return
+
+        node._slot = self.nslots
+        self.nslots += 1
+        self.scopes[-1][node.value] = node._slot
+
+    def generic_visit(self, node):
+        # nothing to resolve
+        pass
+
+    def visit_Name(self, node):
+        for scope in reversed(self.scopes):
+            if node.value in scope:
+                node._slot = scope[node.value]
+                return
+        node._slot = self.global_name(node.value)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaOp(self, node):
+        self.visit(node.arg)
+
+    def visit_Block(self, node):
+        self.scopes.append({})
+        for n in node.statements:
+            self.visit(n)
+        self.scopes.pop()
+
+    visit_Compound = visit_Block
+
+    def visit_Print(self, node):
+        self.visit(node.arg)
+
+    def visit_Var(self, node):
+        # the value is resolved before the name is in scope (var x = x + 1;)
+        if node.arg is not None:
+            self.visit(node.arg)
+        self.declare(node.name)
+
+    visit_Const = visit_Var
+
+    def visit_Assign(self, node):
+        self.visit(node.arg)
+        self.visit(node.name)
+
+    def visit_Attribute(self, node):
+        self.visit(node.name)
+
+    def visit_If(self, node):
+        self.visit(node.cond)
+        self.visit(node.block)
+        if node.eblock is not None:
+            self.visit(node.eblock)
+
+    def visit_While(self, node):
+        self.visit(node.cond)
+        self.visit(node.block)
+
+    def visit_Func(self, node):
+        assert not self.scopes, 'Nested function definition'
+        self.declare(node.name)
+
+        saved = self.nslots
+        self.nslots = 0
+
+        # args and the top level statements of the body share one scope
+        self.scopes.append({})
+        for arg in node.args:
+            self.declare(arg.name)
+        for n in node.block.statements:
+            self.visit(n)
+        self.scopes.pop()
+
+        node._nslots = self.nslots
+        self.nslots = saved
+
+    def visit_Struct(self, node):
+        assert not self.scopes, 'Nested scope definition'
+        self.declare(node.name)
+
+    def visit_Return(self, node):
+        self.visit(node.value)
+
+    def visit_Call(self, node):
+        self.visit(node.name)
+        for arg in node.args:
+            self.visit(arg)
+
+
+def resolve(node):
+    '''Resolve all names in the program node, returns the global names'''
+    return Resolver().resolve(node)
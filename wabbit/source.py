@@ -3,15 +3,15 @@ import sys
 
 from .model import Node
 from .parse import parse
+from .visitor import NodeVisitor
 
 NoneType = type(None)
 
-class SourceVisitor:
+class SourceVisitor(NodeVisitor):
     def visit(self, node, container=None):
         if node is None:
             return ''
-        m = getattr(self, f'visit_{node.__class__.__name__}')
-        s = m(node)
+        s = self.visit_table[node.__class__](self, node)
         if container:
             s = container % (s)
         return s
@@ -72,8 +72,15 @@
 #
 # ----------------------------------------------------------------------
 
-import sys
+import bisect
+import io
+import mmap
 import os.path
+import pathlib
+import re
+import sys
+from array import array
+from collections import namedtuple
 
 import sly
 
@@ -163,30 +170,396 @@ class WabbitLexer(sly.Lexer):
     COMMA = r','
 
     def error(self, t):
-        print("Illegal character '%s'" % t.value[0])
+        if getattr(self, 'lines', None) is None or self.lines.text is not self.text:
+            self.lines = LineIndex(self.text)
+        illegal_character(self.lines.lineno(t.index), t.value[0])
         self.index += 1
 
 
-# High level function that takes input source text and turns it into tokens.
-# This is a natural place to use some kind of generator function.
+# The sly lexer above defines the token set (the parser uses it).
+# tokenize() below matches the same tokens with a single regex, an
+# alternation of named groups, and looks up the token type of keywords
+# and operators in dicts, instead of sly's Token objects, remapping and
+# callbacks.  The regex has as few alternatives as possible, the most
+# frequent first, and skips the blanks before a token (and the
+# indentation after a newline) in the same match.  Tokens are named
+# tuples with the same fields as sly's.
+#
+# Big files don't need to be read into a str first.  tokenize() also
+# takes bytes, a path or a binary file, and lexes the file through an
+# mmap, or in chunks if it can't be mapped (pipes, stdin, ...).  Token
+# values are still str, but index/end are then byte offsets.
+
+Token = namedtuple('Token', ['type', 'value', 'lineno', 'index', 'end'])
+
+_pattern = r"""
+    [ \t]*
+    (?:
+        (?P<NAME>[a-zA-Z_][a-zA-Z0-9_]*)
+      | (?P<newline>\n[\n \t]*)
+      | (?P<FLOAT>\d+\.\d*|\d*\.\d+)
+      | (?P<INTEGER>\d+)
+      | (?P<line_comment>//.*)
+      | (?P<block_comment>/\*[\s\S]*?\*/)
+      %s
+      | (?P<CHAR>'(?:\\'|.)*?')
+      | (?P<op><=|>=|==|!=|&&|\|\||[-+*/<>!=;(){}.,])
+      | (?P<error>%s)
+    )
+"""
+
+_master = re.compile(_pattern % ('', '.'), re.VERBOSE)
+
+# bytes versions, an illegal character is a whole utf8 sequence
+_utf8 = r'[\xc0-\xff][\x80-\xbf]*|.'
+_master_bytes = re.compile((_pattern % ('', _utf8)).encode('latin1'), re.VERBOSE)
+
+# for a chunk of a file, a comment that isn't closed before the end of
+# the chunk may be closed in the next one.  Which quote closes a char
+# depends on the rest of the line, so a char on the last line of the
+# chunk waits for the next chunk too.
+_partial = r"| (?P<partial>/\*[\s\S]*\Z|'(?:\\'|.)*\Z)"
+_master_chunk = re.compile((_pattern % (_partial, _utf8)).encode('latin1'), re.VERBOSE)
+
+CHUNK_SIZE = 1024 * 1024
+
+def illegal_character(lineno, char):
+    print(f"{lineno}: Illegal character '{char}'")
+
+# NAME -> keyword token type
+keywords = {kw.lower(): kw for kw in WabbitLexer._kw}
+
+operators = {
+    '<=': 'LE',
+    '>=': 'GE',
+    '==': 'EQ',
+    '!=': 'NE',
+    '&&': 'LAND',
+    '||': 'LOR',
+    '<': 'LT',
+    '>': 'GT',
+    '!': 'LNOT',
+    '+': 'PLUS',
+    '-': 'MINUS',
+    '*': 'TIMES',
+    '/': 'DIVIDE',
+    '=': 'ASSIGN',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    ';': 'SEMI',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    '.': 'DOT',
+    ',': 'COMMA',
+}
+
+operators_bytes = {k.encode(): v for k, v in operators.items()}
+operator_values = {k.encode(): k for k in operators}
+
+def tokenize(source):
+    '''
+    Generate the tokens of source: text (a str), bytes, or a file given as
+    a path (os.PathLike) or a binary file object
+    '''
+    if isinstance(source, str):
+        return tokenize_text(source)
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return tokenize_bytes(source)
+    return tokenize_file(source)
+
+def tokenize_text(text):
+    lineno = 1
+    new = tuple.__new__
+    for m in _master.finditer(text):
+        group = m.lastgroup
+        value = m.group(group)
+
+        if group == 'NAME':
+            type = keywords.get(value, 'NAME')
+        elif group == 'op':
+            type = operators[value]
+        elif group == 'newline':
+            lineno += value.count('\n')
+            continue
+        elif group == 'FLOAT' or group == 'INTEGER':
+            type = group
+        elif group == 'CHAR':
+            # without the quotes so we can reconstruct it in to_source
+            type = group
+            value = value[1:-1]
+        elif group == 'line_comment':
+            continue
+        elif group == 'block_comment':
+            lineno += value.count('\n')
+            continue
+        else:
+            # blanks at the end of the text end up here
+            if value not in ' \t':
+                illegal_character(lineno, value)
+            continue
+
+        yield new(Token, (type, value, lineno, m.start(group), m.end()))
+
+def tokenize_bytes(data, offset=0, lineno=1, final=True):
+    '''
+    Generate the tokens of utf8 data, which starts at byte offset of the
+    file and on line lineno.  If data isn't the final chunk of the file,
+    stop before the first token that may continue in the next chunk, and
+    return (position in data where to continue, lineno).
+    '''
+    end = len(data)
+    new = tuple.__new__
+    for m in (_master_bytes if final else _master_chunk).finditer(data):
+        group = m.lastgroup
+        if not final and (m.end() == end or group == 'partial'):
+            return m.start(), lineno
+        value = m.group(group)
+
+        if group == 'NAME':
+            value = value.decode('ascii')
+            type = keywords.get(value, 'NAME')
+        elif group == 'op':
+            type = operators_bytes[value]
+            value = operator_values[value]
+        elif group == 'newline':
+            lineno += value.count(b'\n')
+            continue
+        elif group == 'FLOAT' or group == 'INTEGER':
+            type = group
+            value = value.decode('ascii')
+        elif group == 'CHAR':
+            type = group
+            value = value[1:-1].decode('utf8')
+        elif group == 'line_comment':
+            continue
+        elif group == 'block_comment':
+            lineno += value.count(b'\n')
+            continue
+        else:
+            if value not in b' \t':
+                illegal_character(lineno, value.decode('utf8', 'replace'))
+            continue
+
+        yield new(Token, (type, value, lineno, offset + m.start(group), offset + m.end()))
+
+    return end, lineno
+
+def tokenize_file(file, chunk_size=CHUNK_SIZE):
+    '''
+    Generate the tokens of a file, given as a path or a binary file
+    object.  The file is mmap'ed if possible, otherwise read in chunks
+    of chunk_size bytes.
+    '''
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            yield from tokenize_file(f, chunk_size)
+        return
+
+    data = map_file(file)
+    if data is not None:
+        with data:
+            yield from tokenize_bytes(data)
+        return
+
+    offset = 0
+    lineno = 1
+    buf = b''
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            yield from tokenize_bytes(buf, offset, lineno)
+            return
+
+        buf += chunk
+        pos, lineno = yield from tokenize_bytes(buf, offset, lineno, final=False)
+        buf = buf[pos:]
+        offset += pos
+
+def map_file(file):
+    '''mmap of a binary file object, None if it can't be mapped'''
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # not a real file, or empty
+        return None
+
+
+class LineIndex:
+    '''
+    Line and column of offsets in a text (str or bytes), from the
+    offsets of the newlines.  The index is built on first use.
+    '''
+    def __init__(self, text):
+        self.text = text
+        self._newlines = None
+
+    @property
+    def newlines(self):
+        if self._newlines is None:
+            text = self.text
+            nl = '\n' if isinstance(text, str) else b'\n'
+            newlines = self._newlines = array('I')
+            i = text.find(nl)
+            while i >= 0:
+                newlines.append(i)
+                i = text.find(nl, i + 1)
+        return self._newlines
+
+    def lineno(self, index):
+        return bisect.bisect_left(self.newlines, index) + 1
+
+    def column(self, index):
+        line = bisect.bisect_left(self.newlines, index)
+        return index - (self.newlines[line - 1] + 1 if line else 0) + 1
+
+
+# Token types by number, for TokenBuffer.kinds
+TYPES = sorted(WabbitLexer.tokens)
+TYPE = {type: i for i, type in enumerate(TYPES)}
+
+_keyword_kinds = {kw.lower(): TYPE[kw] for kw in WabbitLexer._kw}
+_operator_kinds = {op: TYPE[type] for op, type in operators.items()}
+_group_kinds = {group: TYPE[group] for group in ('FLOAT', 'INTEGER', 'CHAR')}
+
+
+class TokenBuffer:
+    '''
+    All the tokens of a source, without an object per token: the token
+    types are small ints in the array kinds (TYPES[kind] is the name),
+    and the offsets of the tokens in the arrays starts and ends.  Token
+    values are sliced from the text on demand, line numbers come from a
+    LineIndex.
+
+    source is text, bytes, or a file as a path or binary file object.  A
+    file is mmap'ed if possible, and read if not.  Offsets in bytes are
+    byte offsets.
+
+    Iterating gives Token tuples, like tokenize().  errors counts the
+    illegal characters.
+
+    pos and stop lex only part of the text, see scan().
+    '''
+    def __init__(self, source, pos=0, stop=None):
+        if isinstance(source, (str, bytes, bytearray, memoryview, mmap.mmap)):
+            text = source
+        elif isinstance(source, os.PathLike):
+            with open(source, 'rb') as f:
+                text = map_file(f) or f.read()
+        else:
+            text = map_file(source) or source.read()
+
+        self.text = text
+        self.binary = not isinstance(text, str)
+        self.lines = LineIndex(text)
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.errors = 0
+        self.stop = self.scan(pos, stop)
+
+    def scan(self, pos=0, stop=None):
+        '''
+        Add the tokens from offset pos, a token boundary, up to the first
+        token that starts at or after stop.  Returns the offset of that
+        token, so scanning can go on from there, or None at the end.
+        '''
+        text = self.text
+        if stop is None:
+            stop = len(text) + 1
+        if self.binary:
+            regex = _master_bytes
+            keywords = {k.encode(): v for k, v in _keyword_kinds.items()}
+            operators = {k.encode(): v for k, v in _operator_kinds.items()}
+            blank = b' \t'
+        else:
+            regex = _master
+            keywords = _keyword_kinds
+            operators = _operator_kinds
+            blank = ' \t'
+        groups = _group_kinds
+        NAME = TYPE['NAME']
+        kinds = self.kinds.append
+        starts = self.starts.append
+        ends = self.ends.append
+
+        for m in regex.finditer(text, pos):
+            group = m.lastgroup
+            start = m.start(group)
+            end = m.end()
+            if start >= stop:
+                return start
+
+            if group == 'NAME':
+                kind = keywords.get(text[start:end], NAME)
+            elif group == 'op':
+                kind = operators[text[start:end]]
+            elif group in groups:
+                kind = groups[group]
+            elif group == 'error':
+                if text[start:end] not in blank:
+                    self.error(start)
+                continue
+            else:
+                # newlines, comments
+                continue
+
+            kinds(kind)
+            starts(start)
+            ends(end)
+
+        return None
+
+    def error(self, index):
+        self.errors += 1
+        char = self.text[index:index + 1]
+        if self.binary:
+            char = self.text[index:index + 4].decode('utf8', 'replace')[0]
+        illegal_character(self.lines.lineno(index), char)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def type(self, i):
+        return TYPES[self.kinds[i]]
+
+    def value(self, i):
+        value = self.text[self.starts[i]:self.ends[i]]
+        if self.binary:
+            value = value.decode('utf8')
+        if self.kinds[i] == _group_kinds['CHAR']:
+            value = value[1:-1]
+        return value
+
+    def lineno(self, i):
+        return self.lines.lineno(self.starts[i])
+
+    def column(self, i):
+        return self.lines.column(self.starts[i])
+
+    def __getitem__(self, i):
+        return Token(self.type(i), self.value(i), self.lineno(i), self.starts[i], self.ends[i])
 
-def tokenize(text):
-    lexer = WabbitLexer()
-    for tok in lexer.tokenize(text):
-        yield tok
+    def __iter__(self):
+        newlines = self.lines.newlines
+        line = 0
+        for i in range(len(self.kinds)):
+            # the tokens are in order, so the line only moves forward
+            start = self.starts[i]
+            while line < len(newlines) and newlines[line] < start:
+                line += 1
+            yield Token(TYPES[self.kinds[i]], self.value(i), line + 1, start, self.ends[i])
 
 # Main program to test on input files
 def main(args):
     if args:
         if os.path.isfile(args[0]):
-            with open(args[0]) as file:
-                text = file.read()
+            source = pathlib.Path(args[0])
         else:
-            text = args[0]
+            source = args[0]
     else:
-        text = sys.stdin.read()
+        source = sys.stdin.buffer
 
-    for tok in tokenize(text):
+    for tok in tokenize(source):
         print(tok)
 
 if __name__ == '__main__':
@@ -0,0 +1,200 @@
+# trace.py
+#
+# Tracers for the Interpreter.  A tracer is installed when the
+# Interpreter is created:
+#
+#     Interpreter(tracer=CountingTracer())
+#
+# and gets called back as the program runs.  Without a tracer the
+# Interpreter runs its normal methods and pays nothing for this.
+#
+#     python3 -m wabbit.interp --debug prog.wb          # step through it
+#     python3 -m wabbit.interp --trace count prog.wb    # report to stderr
+#     python3 -m wabbit.interp --trace time prog.wb
+#     python3 -m wabbit.interp --profile prog.wb
+#     python3 -m wabbit.interp --flamegraph prog.folded prog.wb
+
+import sys
+import time
+from collections import Counter, defaultdict
+
+
+class Tracer:
+    '''Base tracer, override the callbacks you're interested in'''
+
+    def start(self, node):
+        '''before the program node runs'''
+
+    def stop(self):
+        '''after the program (including main()) is done'''
+
+    def enter(self, node):
+        '''before node is visited'''
+
+    def exit(self, node, value):
+        '''after node is visited, value is the result of the visit'''
+
+    def call(self, func, args):
+        '''before the Func node func is called with the list of args'''
+
+    def ret(self, func, value):
+        '''after the Func node func returned value'''
+
+    def print(self, value):
+        '''the program printed value'''
+
+    def report(self, file=sys.stderr):
+        '''write a summary after the program is done'''
+
+
+class StepTracer(Tracer):
+    '''Interactive stepping, show each visit and wait for enter'''
+
+    def __init__(self, input=input, file=sys.stdout):
+        self.input = input
+        self.file = file
+
+    def exit(self, node, value):
+        print('visit', node, '-->', value, file=self.file)
+        self.input()
+
+
+class CountingTracer(Tracer):
+    '''Count node visits by node type, and calls by function'''
+
+    def __init__(self):
+        self.nodes = Counter()
+        self.calls = Counter()
+        self.prints = 0
+
+    def enter(self, node):
+        self.nodes[node.__class__.__name__] += 1
+
+    def call(self, func, args):
+        self.calls[func.name.value] += 1
+
+    def print(self, value):
+        self.prints += 1
+
+    def report(self, file=sys.stderr):
+        print(f'{"node":16s} {"visits":>12s}', file=file)
+        for name, count in self.nodes.most_common():
+            print(f'{name:16s} {count:12d}', file=file)
+        print(file=file)
+        print(f'{"function":16s} {"calls":>12s}', file=file)
+        for name, count in self.calls.most_common():
+            print(f'{name:16s} {count:12d}', file=file)
+        print(file=file)
+        print(f'prints: {self.prints}', file=file)
+
+
+class TimingTracer(Tracer):
+    '''Accumulate the (inclusive) time spent in each node type'''
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.times = defaultdict(float)
+        self.counts = Counter()
+        self.stack = []
+
+    def enter(self, node):
+        self.stack.append(self.clock())
+
+    def exit(self, node, value):
+        elapsed = self.clock() - self.stack.pop()
+        name = node.__class__.__name__
+        self.times[name] += elapsed
+        self.counts[name] += 1
+
+    def report(self, file=sys.stderr):
+        print(f'{"node":16s} {"visits":>12s} {"seconds":>12s} {"usec/visit":>12s}', file=file)
+        for name, t in sorted(self.times.items(), key=lambda _: -_[1]):
+            n = self.counts[name]
+            print(f'{name:16s} {n:12d} {t:12.6f} {t / n * 1e6:12.3f}', file=file)
+
+
+class Profiler(Tracer):
+    '''
+    Profile a program by wabbit function: calls, inclusive time (time
+    until the function returns) and exclusive time (inclusive minus the
+    time spent in the functions it called).  The top-level code counts
+    as the function '<module>'.  Node visits are counted by node type.
+
+    collapsed() gives the exclusive time of every distinct call stack in
+    the 'folded' format of flamegraph.pl and compatible tools:
+
+        <module>;main;mandel;in_mandelbrot 1234567
+
+    with the time in microseconds.
+    '''
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.nodes = Counter()
+        self.calls = Counter()
+        self.inclusive = defaultdict(float)
+        self.exclusive = defaultdict(float)
+        self.stacks = defaultdict(float)
+
+        # [name, start time, time in callees], innermost last
+        self.stack = []
+        self.active = Counter()     # recursion depth by function
+
+    def enter(self, node):
+        self.nodes[node.__class__.__name__] += 1
+
+    def push(self, name):
+        self.calls[name] += 1
+        self.active[name] += 1
+        self.stack.append([name, self.clock(), 0.0])
+
+    def pop(self):
+        name, start, callees = self.stack.pop()
+        elapsed = self.clock() - start
+
+        self.active[name] -= 1
+        if not self.active[name]:
+            # only the outermost call of a recursive function counts, or the
+            # time would be counted more than once
+            self.inclusive[name] += elapsed
+        self.exclusive[name] += elapsed - callees
+        key = ';'.join([_[0] for _ in self.stack] + [name])
+        self.stacks[key] += elapsed - callees
+
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def start(self, node):
+        self.push('<module>')
+
+    def stop(self):
+        while self.stack:
+            self.pop()
+
+    def call(self, func, args):
+        self.push(func.name.value)
+
+    def ret(self, func, value):
+        self.pop()
+
+    def collapsed(self):
+        '''lines of "stack time" with the time in microseconds'''
+        for key, t in sorted(self.stacks.items()):
+            yield f'{key} {round(t * 1e6)}'
+
+    def report(self, file=sys.stderr):
+        print(f'{"function":24s} {"calls":>10s} {"incl s":>12s} {"excl s":>12s} {"usec/call":>10s}', file=file)
+        for name, t in sorted(self.exclusive.items(), key=lambda _: -_[1]):
+            n = self.calls[name]
+            incl = self.inclusive[name]
+            print(f'{name:24s} {n:10d} {incl:12.6f} {t:12.6f} {incl / n * 1e6:10.1f}', file=file)
+        print(file=file)
+        print(f'{"node":24s} {"visits":>10s}', file=file)
+        for name, count in self.nodes.most_common():
+            print(f'{name:24s} {count:10d}', file=file)
+
+
+TRACERS = {
+    'count': CountingTracer,
+    'time': TimingTracer,
+    'profile': Profiler,
+}
@@ -0,0 +1,58 @@
+# visitor.py
+#
+# Dispatch on the class of a model node, shared by the tree walkers
+# (interpreter, compilers, source printer, ...).  A walker subclasses
+# NodeVisitor and defines visit_<class name> methods:
+#
+#     class Printer(NodeVisitor):
+#         def visit_Integer(self, node):
+#             ...
+#
+#     Printer().visit(node)
+#
+# For every prefix in the class' prefixes ('visit' by default), the
+# subclass gets a <prefix>_table: a dict of node class -> function,
+# filled in the first time a node class is seen.  A node class without
+# its own method falls back along its MRO, so visit_Node catches every
+# node, and after that to generic_<prefix> if the walker defines one.
+#
+# A walker with a different signature, or extra work per node, defines
+# its own visit() on top of the table:
+#
+#     def visit(self, node, dest=None):
+#         return self.visit_table[node.__class__](self, node, dest)
+
+
+class DispatchTable(dict):
+    '''node class -> function of visitor_class for prefix'''
+
+    def __init__(self, visitor_class, prefix, overrides=()):
+        super().__init__(overrides)
+        self.visitor_class = visitor_class
+        self.prefix = prefix
+
+    def __missing__(self, node_class):
+        for cls in node_class.__mro__:
+            m = getattr(self.visitor_class, f'{self.prefix}_{cls.__name__}', None)
+            if m is not None:
+                break
+        else:
+            m = getattr(self.visitor_class, f'generic_{self.prefix}', None)
+            if m is None:
+                raise AttributeError(f'{self.visitor_class.__name__!r} object has no attribute '
+                                     f'{self.prefix + "_" + node_class.__name__!r}')
+        self[node_class] = m
+        return m
+
+
+class NodeVisitor:
+    prefixes = ('visit',)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for prefix in cls.prefixes:
+            setattr(cls, f'{prefix}_table', DispatchTable(cls, prefix))
+
+    def visit(self, node):
+        return self.visit_table[node.__class__](self, node)
+
@@ -0,0 +1,293 @@
+# wbc.py
+#
+# Binary encoding of the model, the .wbc format:
+#
+#     b'WBC\0'
+#     varint    FORMAT
+#     8 bytes   schema key: hash of the node classes and their fields
+#     varint    number of strings, then each as varint length + utf8
+#     ops       until the end of the data
+#
+# The ops build the tree bottom-up on a stack, like a postfix
+# expression: every op is a varint that pushes a value, and a node or
+# list op pops its items first.
+#
+#     NONE, TRUE, FALSE
+#     INT       followed by the value as a zigzag varint
+#     FLOAT     followed by 8 bytes, little endian double
+#     STR       followed by the index into the strings
+#     LIST      followed by n, pops n values
+#     NODE + k  node of class KINDS[k], pops one value per field
+#
+# At the end the stack holds the root.  Annotations added by passes
+# (_var, _slot, ...) aren't kept.
+#
+#     data = dumps(model)
+#     model = loads(data)          # bytes, memoryview, mmap, ...
+#
+# load() maps the file and reads it in place.
+#
+# parse() uses the format to cache the models of files it parses, see
+# cached_parse().  The least recently used ones are removed when the
+# cache is over $WABBIT_WBC_CACHE_MB megabytes (default 64).
+
+import hashlib
+import mmap
+import os
+import pathlib
+import struct
+import sys
+
+from .build import evict
+from .flat import KINDS, KIND
+from .lrcache import cache_dir
+from .model import *
+from .parse import parse
+
+FORMAT = 1
+MAGIC = b'WBC\0'
+
+NONE, TRUE, FALSE, INT, FLOAT, STR, LIST, NODE = range(8)
+
+_double = struct.Struct('<d')
+
+def schema_key():
+    '''8 bytes that change with the node classes and their fields'''
+    h = hashlib.sha256()
+    for cls in KINDS:
+        h.update(f'{cls.__name__} {cls._fields}\n'.encode())
+    return h.digest()[:8]
+
+SCHEMA = schema_key()
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+def dumps(root):
+    '''the .wbc encoding of the tree under root'''
+    strings = {}
+    ops = bytearray()
+
+    # postorder, without recursion: a node or list is pushed again after
+    # its items, as a tuple, to be written once they are
+    stack = [root]
+    while stack:
+        value = stack.pop()
+        if value.__class__ is tuple:
+            op, n = value
+            if op == LIST:
+                ops.append(LIST)
+                write_varint(ops, n)
+            else:
+                write_varint(ops, op)
+        elif isinstance(value, Node):
+            stack.append((NODE + KIND[value.__class__], 0))
+            stack.extend(getattr(value, _) for _ in reversed(value._fields))
+        elif isinstance(value, list):
+            stack.append((LIST, len(value)))
+            stack.extend(reversed(value))
+        elif value is None:
+            ops.append(NONE)
+        elif value is True:
+            ops.append(TRUE)
+        elif value is False:
+            ops.append(FALSE)
+        elif isinstance(value, int):
+            ops.append(INT)
+            write_varint(ops, value << 1 if value >= 0 else (~value << 1) | 1)
+        elif isinstance(value, float):
+            ops.append(FLOAT)
+            ops += _double.pack(value)
+        elif isinstance(value, str):
+            i = strings.get(value)
+            if i is None:
+                i = strings[value] = len(strings)
+            ops.append(STR)
+            write_varint(ops, i)
+        else:
+            raise TypeError(f"can't encode {value!r}")
+
+    out = bytearray(MAGIC)
+    write_varint(out, FORMAT)
+    out += SCHEMA
+    write_varint(out, len(strings))
+    for s in strings:
+        b = s.encode('utf8')
+        write_varint(out, len(b))
+        out += b
+    out += ops
+    return bytes(out)
+
+def loads(data):
+    '''the tree encoded in data, anything with the buffer protocol'''
+    view = memoryview(data)
+    end = len(view)
+
+    def varint(pos):
+        b = view[pos]
+        pos += 1
+        if b < 0x80:
+            return b, pos
+        n = b & 0x7f
+        shift = 7
+        while True:
+            b = view[pos]
+            pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                return n, pos
+            shift += 7
+
+    try:
+        if view[:4] != MAGIC:
+            raise ValueError('not a .wbc file')
+        version, pos = varint(4)
+        if version != FORMAT:
+            raise ValueError(f'.wbc format {version}, expected {FORMAT}')
+        if view[pos:pos + 8] != SCHEMA:
+            raise ValueError('.wbc file written for other model classes')
+        pos += 8
+
+        count, pos = varint(pos)
+        strings = []
+        for _ in range(count):
+            n, pos = varint(pos)
+            strings.append(str(view[pos:pos + n], 'utf8'))
+            pos += n
+
+        # node op -> (class, its fields)
+        kinds = [(cls, cls._fields) for cls in KINDS]
+
+        stack = []
+        push = stack.append
+        while pos < end:
+            op = view[pos]
+            pos += 1
+            if op >= 0x80:
+                op, pos = varint(pos - 1)
+
+            if op >= NODE:
+                cls, names = kinds[op - NODE]
+                if cls is Unit:
+                    push(UNIT)
+                    continue
+                node = cls.__new__(cls)
+                if names:
+                    if len(stack) < len(names):
+                        raise ValueError('bad .wbc data')
+                    values = stack[-len(names):]
+                    del stack[-len(names):]
+                    for name, value in zip(names, values):
+                        setattr(node, name, value)
+                push(node)
+            elif op == STR:
+                i, pos = varint(pos)
+                push(strings[i])
+            elif op == LIST:
+                n, pos = varint(pos)
+                if n:
+                    if len(stack) < n:
+                        raise ValueError('bad .wbc data')
+                    items = stack[-n:]
+                    del stack[-n:]
+                else:
+                    items = []
+                push(items)
+            elif op == INT:
+                n, pos = varint(pos)
+                push(n >> 1 if not n & 1 else ~(n >> 1))
+            elif op == FLOAT:
+                push(_double.unpack_from(view, pos)[0])
+                pos += 8
+            elif op == NONE:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            else:
+                push(False)
+    except (IndexError, struct.error):
+        raise ValueError('truncated .wbc data') from None
+    finally:
+        view.release()
+
+    if len(stack) != 1 or not isinstance(stack[0], Node):
+        raise ValueError('bad .wbc data')
+    return stack[0]
+
+def dump(root, filename):
+    '''write the .wbc encoding of root to filename, atomically'''
+    tmp = f'{filename}.{os.getpid()}'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(dumps(root))
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load(filename):
+    '''the tree in the .wbc file filename, read in place from a mapping'''
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError('not a .wbc file')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return loads(data)
+
+
+def max_size():
+    return int(os.environ.get('WABBIT_WBC_CACHE_MB', 64)) << 20
+
+def cached_parse(data, parser, parse_text):
+    '''
+    The model of the source text data (bytes or an mmap), from the cache
+    if it has been parsed before, otherwise parse_text(data), which
+    returns the model and the number of errors reported, and save it if
+    there were none.  Files are keyed by the hash of the text, the parser
+    and the format, so an edited file or a new format is a miss.  A cache
+    that can't be read or written is skipped.
+    '''
+    h = hashlib.sha256()
+    h.update(f'{FORMAT} {parser} '.encode() + SCHEMA)
+    h.update(data)
+    directory = os.path.join(cache_dir(), 'wbc')
+    filename = os.path.join(directory, f'{h.hexdigest()}.wbc')
+
+    try:
+        model = load(filename)
+        os.utime(filename)
+        return model
+    except (OSError, ValueError):
+        pass
+
+    model, errors = parse_text(data)
+    if errors:
+        # not saved, parsing the file again must report the errors again
+        return model
+    try:
+        os.makedirs(directory, exist_ok=True)
+        dump(model, filename)
+        evict(directory, max_size())
+    except OSError:
+        pass
+    return model
+
+
+def main(args):
+    '''
+    python3 -m wabbit.wbc file.wb [out.wbc]     write the .wbc of file.wb
+    python3 -m wabbit.wbc file.wbc              print the model in file.wbc
+    '''
+    if args[0].endswith('.wbc'):
+        print(load(args[0]))
+        return
+
+    model = parse(pathlib.Path(args[0]), cache=False)
+    out = args[1] if len(args) > 1 else os.path.splitext(args[0])[0] + '.wbc'
+    dump(model, out)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])